@@ -0,0 +1,59 @@
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from .cache import cached_user, password_marker
+
+# User fields copied into issued tokens
+TOKEN_CLAIMS = ('is_staff_member', 'is_active')
+# Claim holding the password marker, so a password change revokes older tokens
+PASSWORD_CLAIM = 'pwd'
+
+
+def token_claims(user):
+    return {
+        **{claim: getattr(user, claim) for claim in TOKEN_CLAIMS},
+        PASSWORD_CLAIM: password_marker(user),
+    }
+
+
+def tokens_for_user(user):
+    """Refresh token for `user` carrying its token_claims; its access tokens inherit them"""
+    refresh = RefreshToken.for_user(user)
+    for claim, value in token_claims(user).items():
+        refresh[claim] = value
+    return refresh
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves users through the cache.
+
+    Users are cached for AUTH_USER_CACHE_TIMEOUT seconds and dropped whenever
+    their row is saved or deleted, so authenticated requests normally run no
+    user query at all. Only the fields authentication needs are cached (see
+    accounts.cache), never the password hash. Tokens whose claims no longer
+    match the user (e.g. staff access was revoked or the password changed)
+    are rejected; tokens issued without the claims are accepted as before.
+    """
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        user = cached_user(user_id, lambda: self.load_user(user_id))
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+
+        for claim, value in token_claims(user).items():
+            if claim in validated_token and validated_token[claim] != value:
+                raise AuthenticationFailed('Token is out of date, please log in again', code='token_stale')
+        return user
+
+    def load_user(self, user_id):
+        try:
+            return self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed('User not found', code='user_not_found')
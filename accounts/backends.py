@@ -17,6 +17,8 @@ class LoginBackend(ModelBackend):
             if user.check_password(password):
                 return user
         except UserModel.DoesNotExist:
+            # Hash anyway so unknown logins take as long as wrong passwords
+            UserModel().set_password(password)
             return None
             
         return None
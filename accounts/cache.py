@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router, transaction
+
+# What authentication and permission checks read from a user; only these are cached
+CACHED_USER_FIELDS = ('id', 'login', 'is_active', 'is_staff_member')
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def password_marker(user):
+    """Short HMAC of the user's password hash; changes whenever the password does"""
+    if hasattr(user, '_password_marker'):
+        return user._password_marker
+    return user.get_session_auth_hash()[:16]
+
+
+def cached_user(user_id, load):
+    """
+    Return the user for `user_id` rebuilt from the cache, calling `load()` on a miss.
+
+    The cache holds CACHED_USER_FIELDS and the password marker, never the
+    password hash. The user returned is a deferred instance: reading any
+    other field runs a query, so views that need the full row should load it.
+    """
+    key = user_cache_key(user_id)
+    entry = cache.get(key)
+    if entry is None:
+        user = load()
+        entry = {name: getattr(user, name) for name in CACHED_USER_FIELDS}
+        entry['password_marker'] = password_marker(user)
+        cache.set(key, entry, timeout=settings.AUTH_USER_CACHE_TIMEOUT)
+
+    model = get_user_model()
+    # from_db takes the loaded columns in field order and defers the rest
+    names = [field.attname for field in model._meta.concrete_fields if field.attname in CACHED_USER_FIELDS]
+    user = model.from_db(router.db_for_read(model), names, [entry[name] for name in names])
+    user._password_marker = entry['password_marker']
+    return user
+
+
+def invalidate_user(user_id):
+    """
+    Drop a cached user.
+
+    The entry is deleted straight away and again on commit, so a request that
+    reads the old row before the writing transaction commits cannot leave it
+    cached.
+    """
+    key = user_cache_key(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
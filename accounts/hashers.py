@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 with the iteration count from settings.PBKDF2_ITERATIONS"""
+    @property
+    def iterations(self):
+        return settings.PBKDF2_ITERATIONS or super().iterations
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Argon2id with the time and memory cost from settings"""
+    @property
+    def time_cost(self):
+        return settings.ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.ARGON2_MEMORY_COST
+
+
+class BCryptSHA256PasswordHasher(hashers.BCryptSHA256PasswordHasher):
+    """bcrypt-SHA256 with the log2 rounds from settings.BCRYPT_ROUNDS"""
+    @property
+    def rounds(self):
+        return settings.BCRYPT_ROUNDS
@@ -0,0 +1,71 @@
+import math
+import statistics
+import time
+import uuid
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.test import APIRequestFactory
+from accounts.models import User
+from accounts.views import UserViewSet
+
+WORK_FACTORS = ('iterations', 'time_cost', 'memory_cost', 'rounds')
+
+
+class Command(BaseCommand):
+    help = 'Time the login endpoint in this process and report logins/sec for one sync gunicorn worker'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=50, help='Logins to time')
+        parser.add_argument('--target', type=float, default=0, help='Peak logins/sec to size workers for')
+
+    def handle(self, *args, **options):
+        if options['logins'] < 1:
+            raise CommandError('--logins must be positive')
+        if options['target'] < 0:
+            raise CommandError('--target cannot be negative')
+
+        hasher = get_hasher()
+        factors = ', '.join(
+            f'{name}={getattr(hasher, name)}' for name in WORK_FACTORS if hasattr(hasher, name)
+        )
+        self.stdout.write(f'Hasher: {hasher.algorithm} ({factors})')
+
+        login = f'benchmark-{uuid.uuid4().hex[:8]}'
+        password = uuid.uuid4().hex
+        user = User.objects.create_user(
+            login=login,
+            email=f'{login}@bench.local',
+            name='Login Benchmark',
+            role='Benchmark',
+            password=password,
+            is_staff_member=True
+        )
+        try:
+            timings = self.time_logins(login, password, options['logins'])
+        finally:
+            user.delete()
+
+        p50 = statistics.median(timings)
+        p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else p50
+        per_worker = 1000 / statistics.mean(timings)
+        self.stdout.write(f'Login p50 {p50:.1f} ms, p95 {p95:.1f} ms')
+        self.stdout.write(f'One sync worker sustains ~{per_worker:.1f} logins/sec')
+        if options['target']:
+            workers = math.ceil(options['target'] / per_worker)
+            self.stdout.write(f"{options['target']:g} logins/sec needs at least {workers} sync workers, and as many cores")
+
+    def time_logins(self, login, password, count):
+        """Run `count` logins through the view (plus one warm-up) and return their durations in ms"""
+        view = UserViewSet.as_view({'post': 'login'})
+        factory = APIRequestFactory()
+        timings = []
+        for i in range(count + 1):
+            request = factory.post('/api/accounts/users/login/', {'login': login, 'password': password})
+            started = time.perf_counter()
+            response = view(request)
+            elapsed = (time.perf_counter() - started) * 1000
+            if response.status_code != 200:
+                raise RuntimeError(f'Login failed with {response.status_code}: {response.data}')
+            if i:
+                timings.append(elapsed)
+        return timings
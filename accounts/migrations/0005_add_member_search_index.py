@@ -0,0 +1,91 @@
+import logging
+from django.db import DatabaseError, migrations, transaction
+
+logger = logging.getLogger(__name__)
+
+# The index as it was when this migration was written; kept literal so that
+# later changes to api.search cannot alter what this migration does
+SQLITE_CREATE = [
+    "CREATE VIRTUAL TABLE accounts_member_fts USING fts5(id UNINDEXED, name, email, cpf, tokenize='trigram')",
+    'INSERT INTO accounts_member_fts (id, name, email, cpf) SELECT id, name, email, cpf FROM accounts_member',
+    (
+        'CREATE TRIGGER accounts_member_fts_insert AFTER INSERT ON accounts_member'
+        ' BEGIN INSERT INTO accounts_member_fts (id, name, email, cpf) VALUES (new.id, new.name, new.email, new.cpf); END'
+    ),
+    (
+        'CREATE TRIGGER accounts_member_fts_update AFTER UPDATE ON accounts_member'
+        ' WHEN old.name IS NOT new.name OR old.email IS NOT new.email OR old.cpf IS NOT new.cpf'
+        ' BEGIN UPDATE accounts_member_fts SET name = new.name, email = new.email, cpf = new.cpf WHERE id = old.id; END'
+    ),
+    (
+        'CREATE TRIGGER accounts_member_fts_delete AFTER DELETE ON accounts_member'
+        ' BEGIN DELETE FROM accounts_member_fts WHERE id = old.id; END'
+    ),
+]
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS accounts_member_fts_insert',
+    'DROP TRIGGER IF EXISTS accounts_member_fts_update',
+    'DROP TRIGGER IF EXISTS accounts_member_fts_delete',
+    'DROP TABLE IF EXISTS accounts_member_fts',
+]
+POSTGRESQL_CREATE = [
+    'CREATE INDEX accounts_member_name_trgm ON accounts_member USING gin (name gin_trgm_ops)',
+    'CREATE INDEX accounts_member_email_trgm ON accounts_member USING gin (email gin_trgm_ops)',
+    'CREATE INDEX accounts_member_cpf_trgm ON accounts_member USING gin (cpf gin_trgm_ops)',
+]
+POSTGRESQL_DROP = [
+    'DROP INDEX IF EXISTS accounts_member_name_trgm',
+    'DROP INDEX IF EXISTS accounts_member_email_trgm',
+    'DROP INDEX IF EXISTS accounts_member_cpf_trgm',
+]
+
+
+def create_trigram_extension(schema_editor):
+    """Install pg_trgm unless it already is; False if the role is not allowed to"""
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        if cursor.fetchone() is not None:
+            return True
+    try:
+        # A savepoint, so a refusal does not abort the migration's transaction
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except DatabaseError:
+        return False
+    return True
+
+
+def create_search_index(apps, schema_editor):
+    """Create the full-text index backing api.search for this database"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        statements = SQLITE_CREATE
+    elif vendor == 'postgresql':
+        if not create_trigram_extension(schema_editor):
+            logger.warning(
+                'pg_trgm is not installed and could not be created, so accounts_member gets no search index; '
+                'searches on it scan the table (see "Search indexes" in the README)'
+            )
+            return
+        statements = POSTGRESQL_CREATE
+    else:
+        return
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    statements = {'sqlite': SQLITE_DROP, 'postgresql': POSTGRESQL_DROP}.get(schema_editor.connection.vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_add_member_name_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -2,6 +2,7 @@ import uuid
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.db import models
 from django.core.validators import RegexValidator, EmailValidator
+from .cache import invalidate_user
 
 
 class CustomUserManager(BaseUserManager):
@@ -57,6 +58,11 @@ class User(AbstractUser):
         if self.login:
             self.username = self.login
         super().save(*args, **kwargs)
+        invalidate_user(self.pk)
+
+    def delete(self, *args, **kwargs):
+        invalidate_user(self.pk)
+        return super().delete(*args, **kwargs)
 
     def __str__(self):
         return f"{self.name} - {self.role}"
@@ -98,6 +104,9 @@ class Member(models.Model):
         verbose_name = 'Member'
         verbose_name_plural = 'Members'
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['name'], name='accounts_member_name_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.email}"
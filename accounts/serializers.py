@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
+from rest_framework.validators import UniqueValidator
 from .models import User, Member
 
 
@@ -38,12 +39,8 @@ class UserSerializer(serializers.ModelSerializer):
         return data
 
     def create(self, validated_data):
-        """Create a new user with encrypted password"""
-        password = validated_data.pop('password')
-        user = User.objects.create_user(**validated_data)
-        user.set_password(password)
-        user.save()
-        return user
+        """Create a new user, hashing the password once"""
+        return User.objects.create_user(**validated_data)
 
     def update(self, instance, validated_data):
         """Update user, handling password separately"""
@@ -113,3 +110,20 @@ class MemberSerializer(serializers.ModelSerializer):
     def validate_email(self, value):
         """Normalize email address"""
         return value.lower()
+
+
+class MemberImportSerializer(MemberSerializer):
+    """
+    MemberSerializer for bulk imports.
+
+    The per-row unique CPF/email lookups are dropped; the importer checks
+    duplicates for a whole chunk in one query instead.
+    """
+    def get_fields(self):
+        fields = super().get_fields()
+        for name in ('cpf', 'email'):
+            fields[name].validators = [
+                validator for validator in fields[name].validators
+                if not isinstance(validator, UniqueValidator)
+            ]
+        return fields
@@ -1,7 +1,18 @@
-from django.test import TestCase
+import importlib.util
+import io
+from unittest import mock, skipUnless
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from .cache import CACHED_USER_FIELDS, user_cache_key
+from .hashers import PBKDF2PasswordHasher
 from .models import User, Member
 
 
@@ -550,6 +561,178 @@ class MemberViewSetTestCase(APITestCase):
         names = [member['name'] for member in response.data['results']]
         self.assertEqual(names, sorted(names))  # Should be in alphabetical order
 
+    def test_list_members_with_fields(self):
+        """Test that ?fields= trims members to the named fields and columns"""
+        self.client.force_authenticate(user=self.test_user)
+        url = reverse('member-list')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'fields': 'id,name'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0], {'id': str(self.member2.id), 'name': 'Jane Smith'})
+        self.assertNotIn('"cpf"', queries[-1]['sql'])
+
+
+class TokenAuthenticationTestCase(APITestCase):
+    """Test cases for cached JWT authentication"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            login='tokenuser',
+            email='token@example.com',
+            name='Token User',
+            role='Librarian',
+            password='tokenpass123',
+            is_staff_member=True
+        )
+        response = self.client.post(reverse('user-login'), {'login': 'tokenuser', 'password': 'tokenpass123'})
+        self.access = response.data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access}')
+        self.profile_url = reverse('user-profile')
+
+    def test_token_carries_claims(self):
+        """Test that login embeds the staff and active flags in the access token"""
+        token = AccessToken(self.access)
+        self.assertTrue(token['is_staff_member'])
+        self.assertTrue(token['is_active'])
+
+    def test_repeat_requests_skip_user_query(self):
+        """Test that the user row is read once and then served from the cache"""
+        self.assertEqual(self.client.get(self.profile_url).status_code, status.HTTP_200_OK)
+        # What is left is the profile's own read of the full row
+        with self.assertNumQueries(1):
+            response = self.client.get(self.profile_url)
+        self.assertEqual(response.data['login'], 'tokenuser')
+
+    def test_cache_holds_no_password_hash(self):
+        """Test that only the authentication fields and a password marker are cached"""
+        self.client.get(self.profile_url)
+        entry = cache.get(user_cache_key(self.user.id))
+        self.assertEqual(set(entry), {*CACHED_USER_FIELDS, 'password_marker'})
+        self.assertNotIn(self.user.password, entry.values())
+
+    def test_password_change_rejects_token(self):
+        """Test that tokens issued before a password change stop working"""
+        self.client.get(self.profile_url)
+        self.user.set_password('newpass123')
+        self.user.save()
+        response = self.client.get(self.profile_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_changes_invalidate_cache(self):
+        """Test that a saved user is reloaded on the next request"""
+        self.client.get(self.profile_url)
+        self.user.name = 'Renamed User'
+        self.user.save()
+        response = self.client.get(self.profile_url)
+        self.assertEqual(response.data['name'], 'Renamed User')
+
+    def test_revoked_access_rejects_token(self):
+        """Test that tokens stop working once their claims no longer hold"""
+        self.client.get(self.profile_url)
+        self.user.is_staff_member = False
+        self.user.save()
+        response = self.client.get(self.profile_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.user.is_staff_member = True
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(self.profile_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_user_rejects_token(self):
+        """Test that deleting the user drops the cached entry"""
+        self.client.get(self.profile_url)
+        self.user.delete()
+        response = self.client.get(self.profile_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PasswordHashingTestCase(APITestCase):
+    """Test cases for password hashing cost and rehash-on-login"""
+
+    def create_user(self):
+        return User.objects.create_user(
+            login='hashuser',
+            email='hash@example.com',
+            name='Hash User',
+            role='Librarian',
+            password='hashpass123',
+            is_staff_member=True
+        )
+
+    def login(self):
+        return self.client.post(reverse('user-login'), {'login': 'hashuser', 'password': 'hashpass123'})
+
+    def test_register_hashes_once(self):
+        """Test that registration runs the password hasher exactly once"""
+        data = {
+            'login': 'newuser',
+            'email': 'new@example.com',
+            'name': 'New User',
+            'role': 'Librarian',
+            'password': 'newpass123'
+        }
+        with mock.patch.object(
+            PBKDF2PasswordHasher, 'encode', autospec=True, side_effect=PBKDF2PasswordHasher.encode
+        ) as encode:
+            response = self.client.post(reverse('user-register'), data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(encode.call_count, 1)
+        self.assertTrue(User.objects.get(login='newuser').check_password('newpass123'))
+
+    def test_work_factor_is_upgraded_on_login(self):
+        """Test that a raised PBKDF2_ITERATIONS rehashes the password at the next login"""
+        with self.settings(PBKDF2_ITERATIONS=1000):
+            user = self.create_user()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+
+        with self.settings(PBKDF2_ITERATIONS=2000):
+            self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$2000$'))
+
+    @skipUnless(importlib.util.find_spec('argon2'), 'argon2-cffi is not installed')
+    def test_algorithm_is_upgraded_on_login(self):
+        """Test that switching PASSWORD_HASHERS to Argon2 rehashes PBKDF2 passwords at login"""
+        with self.settings(PBKDF2_ITERATIONS=1000):
+            user = self.create_user()
+            hashers = ['accounts.hashers.Argon2PasswordHasher', 'accounts.hashers.PBKDF2PasswordHasher']
+            with self.settings(PASSWORD_HASHERS=hashers, ARGON2_TIME_COST=1, ARGON2_MEMORY_COST=1024):
+                self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+                user.refresh_from_db()
+                self.assertTrue(user.password.startswith('argon2$argon2id$v=19$m=1024,t=1,'))
+                self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+
+    def test_wrong_password_hashes_once(self):
+        """Test that a failed login is only checked by one authentication backend"""
+        self.create_user()
+        with mock.patch.object(
+            PBKDF2PasswordHasher, 'verify', autospec=True, side_effect=PBKDF2PasswordHasher.verify
+        ) as verify:
+            response = self.client.post(reverse('user-login'), {'login': 'hashuser', 'password': 'wrongpass'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(verify.call_count, 1)
+
+    @override_settings(PBKDF2_ITERATIONS=1000)
+    def test_benchmark_logins_command(self):
+        """Test that the benchmark reports throughput and removes its user"""
+        out = io.StringIO()
+        call_command('benchmark_logins', logins=3, target=10, stdout=out)
+        self.assertIn('Hasher: pbkdf2_sha256 (iterations=1000)', out.getvalue())
+        self.assertIn('logins/sec', out.getvalue())
+        self.assertFalse(User.objects.filter(login__startswith='benchmark-').exists())
+
+    def test_benchmark_logins_rejects_bad_options(self):
+        """Test that a login count below one or a negative target is refused"""
+        for options in ({'logins': 0}, {'logins': -1}, {'target': -5}):
+            with self.assertRaises(CommandError):
+                call_command('benchmark_logins', stdout=io.StringIO(), **options)
+        self.assertFalse(User.objects.filter(login__startswith='benchmark-').exists())
+
 
 class UserModelTestCase(TestCase):
     """Test cases for User model"""
@@ -1,5 +1,7 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from api.async_views import async_read_urls
 from rest_framework_simplejwt.views import TokenRefreshView
 from .views import UserViewSet, MemberViewSet
 
@@ -7,10 +9,11 @@ from .views import UserViewSet, MemberViewSet
 router = DefaultRouter()
 router.register('users', UserViewSet)
 router.register('members', MemberViewSet)
+router_urls = async_read_urls(router.urls) if settings.ASYNC_READS else router.urls
 
 urlpatterns = [
     # Router URLs
-    path('', include(router.urls)),
+    path('', include(router_urls)),
     
     # JWT token refresh
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
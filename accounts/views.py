@@ -2,18 +2,24 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework_simplejwt.tokens import RefreshToken
-from django.db import models
 from django.conf import settings
+from api.async_views import AsyncReadMixin
+from api.conditional import ConditionalGetMixin
+from api.search import FullTextSearchFilter
+from api.selection import FieldSelectionMixin
+from .authentication import tokens_for_user
 from .models import User, Member
 from .serializers import UserSerializer, LoginSerializer, MemberSerializer
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(FieldSelectionMixin, viewsets.ModelViewSet):
     """ViewSet for User (staff) operations"""
     queryset = User.objects.all()
     serializer_class = UserSerializer
 
+    def get_queryset(self):
+        return self.select_fields(super().get_queryset())
+
     def get_permissions(self):
         """Configure permissions based on action"""
         if self.action in ['login', 'register']:
@@ -41,7 +47,7 @@ class UserViewSet(viewsets.ModelViewSet):
         serializer = LoginSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.validated_data['user']
-            refresh = RefreshToken.for_user(user)
+            refresh = tokens_for_user(user)
             
             response_data = {
                 'access': str(refresh.access_token),
@@ -73,26 +79,19 @@ class UserViewSet(viewsets.ModelViewSet):
     @action(detail=False)
     def profile(self, request):
         """Get current user's profile"""
-        serializer = self.get_serializer(request.user)
+        # request.user only carries the cached authentication fields
+        serializer = self.get_serializer(User.objects.get(pk=request.user.pk))
         return Response(serializer.data)
 
 
-class MemberViewSet(viewsets.ModelViewSet):
+class MemberViewSet(FieldSelectionMixin, ConditionalGetMixin, AsyncReadMixin, viewsets.ModelViewSet):
     """ViewSet for Member operations"""
     queryset = Member.objects.all()
     serializer_class = MemberSerializer
     permission_classes = [IsAuthenticated]
+    filter_backends = [FullTextSearchFilter]
+    search_fields = ['name', 'email', 'cpf']
 
     def get_queryset(self):
-        """Filter and search members"""
-        queryset = Member.objects.all()
-        search = self.request.query_params.get('search', None)
-        
-        if search:
-            queryset = queryset.filter(
-                models.Q(name__icontains=search) |
-                models.Q(email__icontains=search) |
-                models.Q(cpf__icontains=search)
-            )
-        
-        return queryset.order_by('name')
+        """Members ordered by name; ?search= is handled by FullTextSearchFilter"""
+        return self.select_fields(Member.objects.all().order_by('name'))
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Book, Loan, LoanHistory
+from .models import Book, Job, Loan, LoanHistory, OutboxEvent
 
 
 @admin.register(Book)
@@ -29,3 +29,41 @@ class LoanHistoryAdmin(admin.ModelAdmin):
     search_fields = ('book__title', 'member__name')
     ordering = ('-action_date',)
     raw_id_fields = ('book', 'member')
+
+    def has_add_permission(self, request):
+        # History is written by checkouts and returns only
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    """Admin configuration for OutboxEvent model; shows pending and failed events"""
+    list_display = ('topic', 'created_at', 'attempts', 'available_at', 'last_error')
+    list_filter = ('topic',)
+    ordering = ('id',)
+
+    def has_add_permission(self, request):
+        # Events are written by checkouts and returns only
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """Admin configuration for Job model"""
+    list_display = ('kind', 'status', 'priority', 'attempts', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    ordering = ('-created_at',)
+    raw_id_fields = ('created_by',)
+
+    def has_add_permission(self, request):
+        # Jobs are queued through the API
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
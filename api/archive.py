@@ -0,0 +1,229 @@
+"""
+Cold storage for returned loans and old loan history.
+
+Rows older than the archive horizon leave the hot tables one bounded batch
+at a time. Each batch is written to a gzipped JSONL file under ARCHIVE_DIR,
+recorded as an ArchiveSegment with one ArchivedMember entry per member, and
+deleted, in a single short transaction. A member's archived history is read
+back from the segments the index lists for that member only.
+
+The files are the only copy of archived rows, so ARCHIVE_DIR has to be set
+to persistent storage before anything is archived.
+"""
+import gzip
+import json
+import logging
+import os
+import uuid
+from collections import defaultdict
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F
+from accounts.models import Member
+from .models import ArchivedMember, ArchiveSegment, Book, Loan, LoanHistory
+
+logger = logging.getLogger(__name__)
+
+# `cutoff_field` decides which rows are old enough; batches are taken in
+# `date_field` order, which also dates the segments
+KINDS = {
+    'loans': {
+        'model': Loan,
+        'cutoff_field': 'return_date',
+        # Loans end after they start, so the (status, loan_date) index bounds the scan
+        'date_field': 'loan_date',
+        'filters': {'status': 'RETURNED'},
+        'fields': (
+            'id', 'book_id', 'member_id', 'loan_date', 'due_date', 'return_date', 'status', 'created_at', 'updated_at'
+        ),
+    },
+    'history': {
+        'model': LoanHistory,
+        'cutoff_field': 'action_date',
+        'date_field': 'action_date',
+        'filters': {},
+        'fields': ('id', 'book_id', 'member_id', 'action_type', 'action_date', 'created_at'),
+    },
+}
+
+
+def archive_root():
+    if not settings.ARCHIVE_DIR:
+        raise ImproperlyConfigured(
+            'ARCHIVE_DIR is not set. Point it at persistent storage shared by the web and '
+            'job worker processes; archived rows are deleted from the database and only kept there.'
+        )
+    return settings.ARCHIVE_DIR
+
+
+def read_segment(segment):
+    """Yield the records of an archive segment as dicts of JSON values"""
+    with gzip.open(archive_root() / segment.path, 'rt', encoding='utf-8') as handle:
+        for line in handle:
+            yield json.loads(line)
+
+
+class Archiver:
+    """
+    Move rows of one kind ('loans' or 'history') dated before a cutoff into
+    archive segments.
+
+    Every batch commits on its own, so a run can stop at any point and the
+    next one carries on; rows locked by other transactions are skipped.
+    """
+    def __init__(self, kind, batch_size=None, progress=None):
+        if kind not in KINDS:
+            raise ValueError(f"Unsupported kind '{kind}', expected one of {', '.join(KINDS)}")
+        # Refuse to start before any row is deleted
+        archive_root()
+        self.kind = kind
+        self.spec = KINDS[kind]
+        self.batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+        self.progress = progress
+        self.summary = {'batches': 0, 'rows': 0}
+
+    def run(self, before, max_batches=None):
+        """Archive every row dated before `before`, or `max_batches` batches of them"""
+        while max_batches is None or self.summary['batches'] < max_batches:
+            archived = self.archive_batch(before)
+            if not archived:
+                break
+            self.summary['batches'] += 1
+            self.summary['rows'] += archived
+            if self.progress:
+                self.progress(self.summary)
+        return self.summary
+
+    def candidates(self, before):
+        date_field = self.spec['date_field']
+        return self.spec['model'].objects.filter(
+            **self.spec['filters'],
+            **{f"{self.spec['cutoff_field']}__lt": before, f'{date_field}__lt': before}
+        ).order_by(date_field, 'id')
+
+    def archive_batch(self, before):
+        """Archive the oldest batch of rows; returns how many were archived"""
+        date_field = self.spec['date_field']
+        path = None
+        try:
+            with transaction.atomic():
+                records = list(
+                    self.candidates(before).select_for_update(skip_locked=True, of=('self',)).values(
+                        *self.spec['fields'],
+                        # Kept with the row, which may outlive its book and member
+                        book_title=F('book__title'),
+                        member_name=F('member__name')
+                    )[:self.batch_size]
+                )
+                if not records:
+                    return 0
+
+                first, last = records[0][date_field], records[-1][date_field]
+                path = f'{self.kind}/{first:%Y/%m}/{first}_{last}_{uuid.uuid4().hex[:8]}.jsonl.gz'
+                self.write(path, records)
+
+                segment = ArchiveSegment.objects.create(
+                    kind=self.kind,
+                    path=path,
+                    first_date=first,
+                    last_date=last,
+                    rows=len(records)
+                )
+                ArchivedMember.objects.bulk_create(self.index_members(segment, records))
+                self.spec['model'].objects.filter(pk__in=[record['id'] for record in records]).delete()
+            return len(records)
+        except BaseException:
+            # The rows stay in place, so drop the file the failed batch wrote
+            if path is not None and (archive_root() / path).exists():
+                os.remove(archive_root() / path)
+            raise
+
+    def write(self, path, records):
+        full_path = archive_root() / path
+        full_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(full_path, 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as handle:
+                for record in records:
+                    handle.write((json.dumps(record, cls=DjangoJSONEncoder) + '\n').encode())
+            # The rows are deleted once this commits, so the file must be on disk first
+            raw.flush()
+            os.fsync(raw.fileno())
+
+    def index_members(self, segment, records):
+        date_field = self.spec['date_field']
+        dates = defaultdict(list)
+        for record in records:
+            dates[record['member_id']].append(record[date_field])
+        return [
+            ArchivedMember(
+                segment=segment,
+                member_id=member_id,
+                rows=len(member_dates),
+                first_date=min(member_dates),
+                last_date=max(member_dates)
+            )
+            for member_id, member_dates in dates.items()
+        ]
+
+
+def archived_history(member_id, start_date=None, end_date=None, book_id=None):
+    """
+    A member's archived history as unsaved LoanHistory instances.
+
+    Filters mirror LoanHistoryViewSet.get_queryset. Each row carries
+    `book_title` and `member_name` as archived, and its book and member when
+    they still exist. Segments whose file is missing or unreadable are
+    logged and left out rather than failing the request.
+    """
+    try:
+        member_id = uuid.UUID(str(member_id))
+        book_id = uuid.UUID(str(book_id)) if book_id else None
+    except ValueError:
+        return []
+    start_date = LoanHistory._meta.get_field('action_date').to_python(start_date)
+    end_date = LoanHistory._meta.get_field('action_date').to_python(end_date)
+
+    entries = ArchivedMember.objects.filter(member_id=member_id, segment__kind='history')
+    if start_date:
+        entries = entries.filter(last_date__gte=start_date)
+    if end_date:
+        entries = entries.filter(first_date__lte=end_date)
+
+    rows = []
+    for entry in entries.select_related('segment'):
+        try:
+            records = list(read_segment(entry.segment))
+        except (OSError, EOFError, ValueError, ImproperlyConfigured):
+            logger.exception(
+                'Archive segment %s is missing or unreadable; member %s history is incomplete',
+                entry.segment.path, member_id
+            )
+            continue
+        for record in records:
+            row = history_from_record(record)
+            if row.member_id != member_id:
+                continue
+            if (start_date and row.action_date < start_date) or (end_date and row.action_date > end_date):
+                continue
+            if book_id and row.book_id != book_id:
+                continue
+            rows.append(row)
+
+    books = Book.objects.in_bulk({row.book_id for row in rows})
+    members = Member.objects.in_bulk({row.member_id for row in rows})
+    for row in rows:
+        LoanHistory.book.field.set_cached_value(row, books.get(row.book_id))
+        LoanHistory.member.field.set_cached_value(row, members.get(row.member_id))
+    return rows
+
+
+def history_from_record(record):
+    row = LoanHistory(**{
+        name: LoanHistory._meta.get_field(name.removesuffix('_id')).to_python(record[name])
+        for name in KINDS['history']['fields']
+    })
+    row.book_title = record['book_title']
+    row.member_name = record['member_name']
+    return row
@@ -0,0 +1,118 @@
+from functools import update_wrapper
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from rest_framework.response import Response
+
+READ_ACTIONS = ('list', 'retrieve')
+
+
+def read_actions(view):
+    """READ_ACTIONS plus the viewset's own async_read_actions"""
+    return READ_ACTIONS + tuple(getattr(view, 'async_read_actions', ()))
+
+
+class AsyncReadMixin:
+    """
+    Async counterparts of list and retrieve for a DRF viewset.
+
+    Filtering, serialization, pagination and permissions come from the
+    viewset as usual; only the database round trips differ, running through
+    the async ORM so an ASGI worker keeps serving other requests meanwhile.
+    Routed by async_read_view, which only ASYNC_READS deployments use.
+
+    List-like @action routes can be read asynchronously too: name them in
+    `async_read_actions` and give each an a<action> handler.
+    """
+    async_read_actions = ()
+
+    async def adispatch(self, request, *args, **kwargs):
+        """dispatch() for the async read handlers"""
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            # Authentication may load the user from the database on a cache miss
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            handler = getattr(self, f'a{self.action}')
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def afilter_queryset(self, queryset):
+        # Filter backends may query the database while filtering, as
+        # FullTextSearchFilter does to check for pg_trgm on PostgreSQL
+        return await sync_to_async(self.filter_queryset)(queryset)
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = await self.afilter_queryset(self.get_queryset())
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer([obj async for obj in queryset], many=True)
+        return Response(serializer.data)
+
+    async def apaginate_queryset(self, queryset):
+        if self.paginator is None:
+            return None
+        if hasattr(self.paginator, 'apaginate_queryset'):
+            return await self.paginator.apaginate_queryset(queryset, self.request, view=self)
+        # Stock DRF paginators only have the sync API
+        return await sync_to_async(self.paginator.paginate_queryset)(queryset, self.request, view=self)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
+
+    async def aget_object(self):
+        queryset = await self.afilter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+
+def async_read_view(view):
+    """
+    Wrap a viewset view so GET/HEAD list and retrieve run on the async path.
+
+    Other methods call the sync view in a thread, as Django would for a sync
+    view under ASGI. Viewsets without AsyncReadMixin are returned unchanged.
+    """
+    if not issubclass(getattr(view, 'cls', object), AsyncReadMixin):
+        return view
+    actions = dict(view.actions)
+    if 'get' in actions:
+        actions.setdefault('head', actions['get'])
+    reads = read_actions(view.cls)
+    if not set(actions.values()) & set(reads):
+        return view
+    sync_view = sync_to_async(view)
+
+    async def async_view(request, *args, **kwargs):
+        if actions.get(request.method.lower()) not in reads:
+            return await sync_view(request, *args, **kwargs)
+        self = view.cls(**view.initkwargs)
+        self.action_map = actions
+        return await self.adispatch(request, *args, **kwargs)
+
+    return update_wrapper(async_view, view)
+
+
+def async_read_urls(patterns):
+    """Route the read actions of router `patterns` through async_read_view"""
+    for pattern in patterns:
+        pattern.callback = async_read_view(pattern.callback)
+    return patterns
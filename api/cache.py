@@ -0,0 +1,132 @@
+import hashlib
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+VERSION_KEY = 'catalog:version'
+VALIDATOR_HEADERS = ('ETag', 'Last-Modified')
+HITS_KEY = 'catalog:hits'
+MISSES_KEY = 'catalog:misses'
+
+
+def catalog_version():
+    """Current catalog version; part of every cached response key"""
+    return cache.get_or_set(VERSION_KEY, 1, timeout=None)
+
+
+def _bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 1, timeout=None)
+
+
+def invalidate_catalog():
+    """
+    Retire every cached catalog response.
+
+    The version is bumped straight away and again on commit, so a request
+    that reads the old rows before the writing transaction commits cannot
+    leave them cached under the new version.
+    """
+    _bump_version()
+    transaction.on_commit(_bump_version)
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def cache_stats():
+    """Hit and miss totals for catalog responses"""
+    return {
+        'hits': cache.get(HITS_KEY, 0),
+        'misses': cache.get(MISSES_KEY, 0),
+    }
+
+
+def cached_response(request, build):
+    """
+    Serve `build()`'s response data from the cache when possible.
+
+    Call this after authentication and permission checks; the key only covers
+    the URL (host included, as pagination links are absolute), the sorted
+    query parameters and the catalog version. ETag / Last-Modified headers
+    are cached with the data, so hits answer conditional requests too.
+    """
+    key, response = _lookup(request)
+    if response is None:
+        response = _store(key, build())
+    return response
+
+
+async def acached_response(request, build):
+    """Async counterpart of cached_response; `build` is a coroutine function"""
+    key, response = await sync_to_async(_lookup)(request)
+    if response is None:
+        response = await sync_to_async(_store)(key, await build())
+    return response
+
+
+def _lookup(request):
+    """(key, cached response or None) for a request"""
+    query = sorted(request.query_params.lists())
+    raw_key = f'{request.build_absolute_uri(request.path)}?{query}'
+    key = f'catalog:{catalog_version()}:{hashlib.md5(raw_key.encode()).hexdigest()}'
+
+    cached = cache.get(key)
+    if cached is None:
+        _count(MISSES_KEY)
+        return key, None
+
+    _count(HITS_KEY)
+    data, headers = cached
+    not_modified = get_conditional_response(
+        request._request,
+        etag=headers.get('ETag'),
+        last_modified=parse_http_date_safe(headers.get('Last-Modified'))
+    )
+    if not_modified is not None:
+        for name, value in {**headers, 'X-Cache': 'HIT'}.items():
+            not_modified[name] = value
+        return key, not_modified
+    return key, Response(data, headers={**headers, 'X-Cache': 'HIT'})
+
+
+def _store(key, response):
+    if response.status_code == 200:
+        headers = {name: response[name] for name in VALIDATOR_HEADERS if response.has_header(name)}
+        cache.set(key, (response.data, headers), timeout=settings.CATALOG_CACHE_TIMEOUT)
+    response['X-Cache'] = 'MISS'
+    return response
+
+
+class CachedResponseMixin:
+    """Serve list and retrieve (and their async counterparts) through the response cache"""
+    def list(self, request, *args, **kwargs):
+        return cached_response(
+            request, lambda: super(CachedResponseMixin, self).list(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return cached_response(
+            request, lambda: super(CachedResponseMixin, self).retrieve(request, *args, **kwargs)
+        )
+
+    async def alist(self, request, *args, **kwargs):
+        return await acached_response(
+            request, lambda: super(CachedResponseMixin, self).alist(request, *args, **kwargs)
+        )
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return await acached_response(
+            request, lambda: super(CachedResponseMixin, self).aretrieve(request, *args, **kwargs)
+        )
@@ -0,0 +1,91 @@
+import hashlib
+from datetime import datetime
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified support for list and retrieve.
+
+    The validators come from the rows the response is built from, once they
+    are fetched and before they are serialized: each row's pk and
+    `etag_fields` values, plus the pagination metadata (count and links).
+    Fields on related models can be listed, as `book__updated_at`, so that
+    nested payloads change the ETag too; they must be select_related. A
+    matching If-None-Match or If-Modified-Since is answered with 304 without
+    serializing or rendering anything, and no query is added.
+
+    Only retrieve sends Last-Modified: a deleted or reordered row leaves no
+    timestamp behind, so a list's rows cannot say when the list last changed
+    and lists are validated by their ETag alone.
+    """
+    etag_fields = ('updated_at',)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        return self.list_response(request, list(queryset) if page is None else page, page is not None)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.detail_response(request, self.get_object())
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = await self.afilter_queryset(self.get_queryset())
+        page = await self.apaginate_queryset(queryset)
+        rows = [obj async for obj in queryset] if page is None else page
+        return self.list_response(request, rows, page is not None)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return self.detail_response(request, await self.aget_object())
+
+    def list_response(self, request, rows, paginated):
+        meta = None
+        if paginated:
+            meta = dict(self.get_paginated_response([]).data)
+            meta.pop('results', None)
+
+        headers, response = self.check_validators(
+            request, [self.row_validators(row) for row in rows], meta, dated=False
+        )
+        if response is None:
+            serializer = self.get_serializer(rows, many=True)
+            response = self.get_paginated_response(serializer.data) if paginated else Response(serializer.data)
+        return self.add_validators(response, headers)
+
+    def detail_response(self, request, instance):
+        headers, response = self.check_validators(request, [self.row_validators(instance)])
+        if response is None:
+            response = Response(self.get_serializer(instance).data)
+        return self.add_validators(response, headers)
+
+    def get_etag_fields(self):
+        return self.etag_fields
+
+    def row_validators(self, obj):
+        values = [obj.pk]
+        for field in self.get_etag_fields():
+            value = obj
+            for name in field.split('__'):
+                value = getattr(value, name, None)
+            values.append(value)
+        return values
+
+    def check_validators(self, request, rows, meta=None, dated=True):
+        """(ETag / Last-Modified headers, 304 or 412 response or None) for the row validators"""
+        timestamps = [value for row in rows for value in row if isinstance(value, datetime)]
+        last_modified = int(max(timestamps).timestamp()) if dated and timestamps else None
+        fingerprint = repr((request.get_full_path(), meta, rows))
+        etag = quote_etag(hashlib.md5(fingerprint.encode()).hexdigest())
+
+        headers = {'ETag': etag}
+        if last_modified is not None:
+            headers['Last-Modified'] = http_date(last_modified)
+        return headers, get_conditional_response(request._request, etag=etag, last_modified=last_modified)
+
+    def add_validators(self, response, headers):
+        if response.status_code in (200, 304):
+            for name, value in headers.items():
+                response[name] = value
+        return response
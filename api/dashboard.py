@@ -0,0 +1,73 @@
+"""
+The staff home page's first screen in one request.
+
+Each section is the first page of a collection endpoint, built by that
+endpoint's own viewset (filters, search, pagination, field selection and
+the catalog cache included) for the request's user, so authentication and
+permission checks run once instead of once per collection.
+"""
+import copy
+from django.http import QueryDict
+from django.urls import reverse
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from accounts.views import MemberViewSet
+from .permissions import IsStaffMember
+from .views import BookViewSet, LoanHistoryViewSet, LoanViewSet
+
+# section: (viewset, list URL name, query parameters it takes)
+SECTIONS = {
+    'books': (BookViewSet, 'book-list', ('search',)),
+    'members': (MemberViewSet, 'member-list', ('search',)),
+    'loans': (LoanViewSet, 'loan-list', ('search', 'status')),
+    'history': (LoanHistoryViewSet, 'loanhistory-list', ('search',)),
+}
+
+
+class DashboardView(APIView):
+    """
+    First page of books, members, loans and history.
+
+    ?search= applies to every section and ?status= to loans, as on the
+    collection endpoints; each section is what its endpoint returns for
+    them, pagination links included.
+    """
+    permission_classes = [IsAuthenticated, IsStaffMember]
+
+    def get(self, request):
+        return Response({
+            name: self.section(request, viewset, url_name, params)
+            for name, (viewset, url_name, params) in SECTIONS.items()
+        })
+
+    def section(self, request, viewset, url_name, params):
+        section_request = self.section_request(request, reverse(url_name), params)
+        view = viewset(
+            request=section_request,
+            args=(),
+            kwargs={},
+            format_kwarg=None,
+            action='list'
+        )
+        return view.list(section_request).data
+
+    def section_request(self, request, path, params):
+        """A copy of `request` for `path`, keeping the `params` it has and its authentication"""
+        http_request = copy.copy(request._request)
+        query = QueryDict(mutable=True)
+        for name in params:
+            if name in request.query_params:
+                query.setlist(name, request.query_params.getlist(name))
+        http_request.path = http_request.path_info = path
+        http_request.GET = query
+        http_request.META = {**http_request.META, 'QUERY_STRING': query.urlencode()}
+        # Validators are computed per section; the dashboard's own don't apply
+        for header in ('HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE'):
+            http_request.META.pop(header, None)
+
+        section_request = Request(http_request, parsers=request.parsers, negotiator=request.negotiator)
+        section_request.user = request.user
+        section_request.auth = request.auth
+        return section_request
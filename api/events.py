@@ -0,0 +1,202 @@
+"""
+Live book availability and loan status events, streamed to staff terminals.
+
+Checkouts and returns publish their changes once their transaction
+commits. Each open /api/events/ stream holds a subscription on the
+process's broker, settings.EVENTS_BROKER:
+
+- LocalBroker delivers events published in the same process only, which
+  covers a single ASGI worker.
+- PostgresBroker carries them between processes and nodes over
+  LISTEN/NOTIFY.
+
+Another broker only has to implement publish() and call deliver() with what
+other processes published.
+"""
+import asyncio
+import json
+import logging
+import threading
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+from .renderers import StreamedRenderer
+
+logger = logging.getLogger(__name__)
+
+# Events a stream may fall behind by before it is told to reload instead
+SUBSCRIPTION_QUEUE_SIZE = 1000
+
+# Sent to a stream that missed events, so the client re-fetches what it shows
+RESET_EVENT = {'event': 'reset', 'data': {}}
+
+# Milliseconds a client waits before reconnecting a dropped stream
+RETRY_MS = 5000
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """The process's broker, built from settings.EVENTS_BROKER on first use"""
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(settings.EVENTS_BROKER)()
+        return _broker
+
+
+def loan_events(loan):
+    """The loan status and book availability events for a checkout or return"""
+    return [
+        {
+            'event': 'loan',
+            'data': {
+                'id': str(loan.id),
+                'book': str(loan.book_id),
+                'member': str(loan.member_id),
+                'status': loan.status,
+            },
+        },
+        {
+            'event': 'book',
+            'data': {'id': str(loan.book_id), 'availability': loan.status == 'RETURNED'},
+        },
+    ]
+
+
+def publish_on_commit(events):
+    """Publish `events` once the current transaction commits; nothing is sent if it rolls back"""
+    def publish():
+        broker = get_broker()
+        for event in events:
+            broker.publish(event)
+
+    # A broker failure must not fail the checkout that already committed
+    transaction.on_commit(publish, robust=True)
+
+
+class EventStreamRenderer(StreamedRenderer):
+    media_type = 'text/event-stream'
+    format = 'sse'
+
+
+def format_event(event):
+    return f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+async def event_stream(broker, keepalive):
+    """
+    The text/event-stream body for one client. A comment goes out every
+    `keepalive` seconds without events so proxies keep the connection open.
+    """
+    subscription = await broker.subscribe()
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        while True:
+            event = await subscription.get(timeout=keepalive)
+            yield ': keepalive\n\n' if event is None else format_event(event)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+class Subscription:
+    """One stream's queue of events, filled from any thread and read on its event loop"""
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIPTION_QUEUE_SIZE)
+
+    def put(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The loop is closed; the stream is gone and unsubscribes shortly
+            pass
+
+    def _put(self, event):
+        if self.queue.full():
+            # Behind anyway: drop what is queued and have the client reload
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            event = RESET_EVENT
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout=None):
+        """The next event, or None after `timeout` seconds without one"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LocalBroker:
+    """Delivers events to the subscriptions of this process"""
+    def __init__(self):
+        self.subscriptions = set()
+        self.lock = threading.Lock()
+
+    def publish(self, event):
+        self.deliver(event)
+
+    def deliver(self, event):
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            subscription.put(event)
+
+    async def subscribe(self):
+        """A new Subscription; call unsubscribe() with it when the stream ends"""
+        subscription = Subscription()
+        with self.lock:
+            self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+
+class PostgresBroker(LocalBroker):
+    """
+    Carries events between processes through PostgreSQL LISTEN/NOTIFY.
+
+    publish() sends a NOTIFY on the default database connection. Each
+    process that has streams open keeps one extra connection LISTENing and
+    delivers what arrives, its own events included, to its subscriptions.
+    """
+    CHANNEL = 'library_events'
+    RECONNECT_DELAY = 5
+
+    def __init__(self):
+        super().__init__()
+        self.listener = None
+
+    def publish(self, event):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.CHANNEL, json.dumps(event)])
+
+    async def subscribe(self):
+        subscription = await super().subscribe()
+        loop = asyncio.get_running_loop()
+        if self.listener is None or self.listener.done() or self.listener.get_loop() is not loop:
+            self.listener = asyncio.create_task(self.listen())
+        return subscription
+
+    async def listen(self):
+        import psycopg
+
+        params = {
+            name: value for name, value in connection.get_connection_params().items()
+            if name not in ('cursor_factory', 'context')
+        }
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(**params, autocommit=True) as conn:
+                    await conn.execute(f'LISTEN {self.CHANNEL}')
+                    async for notify in conn.notifies():
+                        self.deliver(json.loads(notify.payload))
+            except psycopg.Error:
+                logger.exception('Event listener lost its connection, reconnecting')
+                # Whatever was sent meanwhile is lost
+                self.deliver(RESET_EVENT)
+                await asyncio.sleep(self.RECONNECT_DELAY)
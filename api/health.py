@@ -25,8 +25,8 @@ def api_health_check(request):
 
 
 @csrf_exempt
-def simple_health_check(request):
-    """Simple health check that works without DRF"""
+async def simple_health_check(request):
+    """Simple health check that works without DRF (async, so ASGI serves it without a thread)"""
     return JsonResponse({
         'status': 'ok',
         'message': 'API is running'
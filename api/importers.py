@@ -0,0 +1,182 @@
+import csv
+import json
+from itertools import islice
+from collections import Counter
+from django.db import transaction
+from django.db.models import Q
+from accounts.models import Member
+from accounts.serializers import MemberImportSerializer
+from .cache import invalidate_catalog
+from .models import Book, CategoryCounter
+from .serializers import BookSerializer
+
+# Rows validated and inserted per transaction
+CHUNK_SIZE = 1000
+
+# Error messages kept in the summary; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+FORMATS = ('csv', 'jsonl')
+
+
+class RecordError(ValueError):
+    """An input line that cannot be parsed into a record"""
+    def __init__(self, line, message):
+        super().__init__(f'Line {line}: {message}')
+        self.line = line
+
+
+class ImportAborted(ValueError):
+    """Reading the input failed partway; `summary` covers the rows imported before it"""
+    def __init__(self, error, summary):
+        super().__init__(f"{error} ({summary['created']} rows imported before it)")
+        self.line = error.line
+        self.summary = summary
+
+
+def read_records(stream, fmt):
+    """Yield one dict per input record from a text stream; raises RecordError on unreadable input"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        try:
+            yield from reader
+        except (csv.Error, UnicodeDecodeError) as exc:
+            raise RecordError(reader.line_num + 1, str(exc))
+    elif fmt == 'jsonl':
+        number = 0
+        try:
+            for number, line in enumerate(stream, 1):
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        except json.JSONDecodeError as exc:
+            raise RecordError(number, f'Invalid JSON: {exc.msg} (column {exc.colno}).')
+        except UnicodeDecodeError as exc:
+            raise RecordError(number + 1, str(exc))
+    else:
+        raise ValueError(f"Unsupported format '{fmt}', expected one of {', '.join(FORMATS)}")
+
+
+def guess_format(filename):
+    """Guess the input format from a file name"""
+    if filename.lower().endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return 'csv'
+
+
+class CatalogImporter:
+    """
+    Validate and insert catalog rows in fixed-size chunks.
+
+    Only one chunk is held in memory at a time, and each chunk is written with
+    a single bulk_create inside its own transaction. If the input turns out
+    to be unreadable partway, the rows before the bad line are still
+    imported and ImportAborted is raised with the summary so far.
+    """
+    def __init__(self, kind, chunk_size=CHUNK_SIZE, progress=None):
+        if kind not in ('books', 'members'):
+            raise ValueError(f"Unsupported kind '{kind}', expected 'books' or 'members'")
+        self.kind = kind
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.summary = {'processed': 0, 'created': 0, 'invalid': 0, 'skipped': 0, 'errors': []}
+
+    def run(self, records):
+        """Import every record and return the summary"""
+        records = iter(records)
+        while True:
+            chunk = []
+            try:
+                chunk.extend(islice(records, self.chunk_size))
+            except RecordError as exc:
+                error = exc
+            else:
+                error = None
+            if chunk:
+                self.import_chunk(chunk)
+                if self.progress:
+                    self.progress(self.summary)
+            if error is not None:
+                raise ImportAborted(error, self.summary)
+            if not chunk:
+                break
+        return self.summary
+
+    def import_chunk(self, chunk):
+        first_row = self.summary['processed'] + 1
+        valid = []
+        for offset, record in enumerate(chunk):
+            data = self.validate(record, first_row + offset)
+            if data is not None:
+                valid.append((first_row + offset, data))
+
+        with transaction.atomic():
+            if self.kind == 'books':
+                objects = [Book(**data) for _, data in valid]
+                Book.objects.bulk_create(objects)
+                # bulk_create skips Book.save, so count the new books here
+                for category, count in Counter(book.category for book in objects).items():
+                    CategoryCounter.adjust(category, available=count)
+                invalidate_catalog()
+                created = len(objects)
+            else:
+                created = self.insert_members(self.deduplicate_members(valid))
+
+        self.summary['processed'] += len(chunk)
+        self.summary['created'] += created
+
+    def validate(self, record, row):
+        """Run the API serializer rules over one record"""
+        serializer_class = BookSerializer if self.kind == 'books' else MemberImportSerializer
+        serializer = serializer_class(data=record)
+        if serializer.is_valid():
+            return serializer.validated_data
+        self.summary['invalid'] += 1
+        self.add_error(row, serializer.errors)
+        return None
+
+    def deduplicate_members(self, valid):
+        """Drop members whose CPF or email already exists, using one query per chunk"""
+        cpfs = {data['cpf'] for _, data in valid}
+        emails = {data['email'] for _, data in valid}
+        taken_cpfs = set()
+        taken_emails = set()
+        existing = Member.objects.filter(Q(cpf__in=cpfs) | Q(email__in=emails))
+        for cpf, email in existing.values_list('cpf', 'email'):
+            taken_cpfs.add(cpf)
+            taken_emails.add(email)
+
+        members = []
+        for row, data in valid:
+            if data['cpf'] in taken_cpfs or data['email'] in taken_emails:
+                self.skip_member(row)
+                continue
+            taken_cpfs.add(data['cpf'])
+            taken_emails.add(data['email'])
+            members.append((row, Member(**data)))
+        return members
+
+    def insert_members(self, members):
+        """
+        Insert (row, member) pairs and return how many were created.
+
+        A member created by another request or import after
+        deduplicate_members looked is skipped by the database instead of
+        failing the chunk; its row is found by the id it was given here.
+        """
+        Member.objects.bulk_create([member for _, member in members], ignore_conflicts=True)
+        inserted = set(
+            Member.objects.filter(pk__in=[member.pk for _, member in members]).values_list('pk', flat=True)
+        )
+        for row, member in members:
+            if member.pk not in inserted:
+                self.skip_member(row)
+        return len(inserted)
+
+    def skip_member(self, row):
+        self.summary['skipped'] += 1
+        self.add_error(row, 'Member with this CPF or email already exists.')
+
+    def add_error(self, row, detail):
+        if len(self.summary['errors']) < MAX_REPORTED_ERRORS:
+            self.summary['errors'].append({'row': row, 'detail': detail})
@@ -0,0 +1,264 @@
+"""
+Database-backed background jobs.
+
+Work too slow for a request (catalog imports, exports, counter rebuilds,
+archiving, overdue sweeps) is queued as a Job row and run by `manage.py run_job_worker`;
+clients follow it at /api/jobs/{id}/. No broker is needed: workers claim
+jobs with SELECT ... FOR UPDATE SKIP LOCKED, highest priority first.
+
+Each kind of job is a function registered with `task`, called with the Job
+and its params. It reports progress through job.report() and returns a
+JSON-able result; a task that can spend longer than JOB_TIMEOUT in one
+statement or transaction, where it cannot report, runs under a Heartbeat
+instead. A job that raises is retried with backoff until it has
+run max_attempts times, then marked FAILED with the error. A job whose
+worker stops reporting for JOB_TIMEOUT seconds is handed out again, so a
+task that can run twice must be safe to rerun.
+"""
+import io
+import logging
+import threading
+import uuid
+from collections import namedtuple
+from datetime import timedelta
+from pathlib import Path
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import serializers
+from .archive import KINDS as ARCHIVE_KINDS, Archiver
+from .exports import EXPORT_CHUNK_SIZE, HISTORY_COLUMNS, LOAN_COLUMNS, CSVEncoder, JSONLinesEncoder, encode_rows
+from .importers import FORMATS, CatalogImporter, read_records
+from .models import Job, Loan, LoanHistory
+from .outbox import retry_delay
+from .overdue import OverdueSweeper
+
+logger = logging.getLogger(__name__)
+
+# func(job, **params); `params` validates what POST /api/jobs/ accepts, and
+# is None for kinds that are only queued by the application
+Task = namedtuple('Task', ['func', 'max_attempts', 'params'])
+
+_tasks = {}
+
+
+def task(kind, max_attempts=3, params=None):
+    """Register the decorated function as the `kind` job"""
+    def register(func):
+        _tasks[kind] = Task(func, max_attempts, params)
+        return func
+    return register
+
+
+def get_task(kind):
+    return _tasks.get(kind)
+
+
+def clean_params(kind, params):
+    """
+    `params` validated for a `kind` job queued through the API. Raises a
+    serializers.ValidationError keyed by the offending field.
+    """
+    spec = get_task(kind)
+    if spec is None or spec.params is None:
+        queueable = sorted(name for name, spec in _tasks.items() if spec.params is not None)
+        raise serializers.ValidationError({'kind': [f'Must be one of {", ".join(queueable)}.']})
+    serializer = spec.params(data=params)
+    if not serializer.is_valid():
+        raise serializers.ValidationError({'params': serializer.errors})
+    return dict(serializer.validated_data)
+
+
+def enqueue(kind, params=None, priority=0, user=None):
+    """Queue a `kind` job; it starts once a worker is free"""
+    return Job.objects.create(
+        kind=kind,
+        params=params or {},
+        priority=priority,
+        max_attempts=get_task(kind).max_attempts,
+        created_by=user
+    )
+
+
+def job_path(name):
+    """Where job input and output files live; JOBS_DIR is shared by web and worker processes"""
+    directory = Path(settings.JOBS_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / name
+
+
+class Heartbeat:
+    """
+    Keep reporting a job alive from a side thread while its task runs.
+
+    The thread uses its own database connection, so its reports commit even
+    while the task sits inside a long transaction, where job.report() would
+    not be seen until the end.
+    """
+    def __init__(self, job, interval=None):
+        self.job = job
+        self.interval = interval or settings.JOB_TIMEOUT / 3
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.beat, name=f'job-{job.pk}-heartbeat', daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+    def beat(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                try:
+                    self.job.report(self.job.progress)
+                except Exception:
+                    logger.exception('Could not record the heartbeat of job %s', self.job.pk)
+        finally:
+            connection.close()
+
+
+def requeue_stale():
+    """Hand out again the running jobs whose worker stopped reporting; returns how many"""
+    now = timezone.now()
+    stale = Job.objects.filter(status='RUNNING', heartbeat_at__lt=now - timedelta(seconds=settings.JOB_TIMEOUT))
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='FAILED', error='Worker stopped responding.', finished_at=now
+    )
+    requeued = stale.update(status='QUEUED', available_at=now)
+    if failed or requeued:
+        logger.warning('Requeued %s and failed %s jobs that stopped responding', requeued, failed)
+    return requeued
+
+
+def claim():
+    """Mark the next due job RUNNING and return it, or None if none is due"""
+    with transaction.atomic():
+        job = Job.objects.select_for_update(skip_locked=True).filter(
+            status='QUEUED',
+            available_at__lte=timezone.now()
+        ).order_by('-priority', 'available_at', 'created_at').first()
+        if job is None:
+            return None
+        job.status = 'RUNNING'
+        job.attempts += 1
+        job.started_at = job.heartbeat_at = timezone.now()
+        job.error = ''
+        job.save(update_fields=['status', 'attempts', 'started_at', 'heartbeat_at', 'error'])
+    return job
+
+
+def run(job):
+    """Run a claimed job and record how it ended"""
+    try:
+        result = get_task(job.kind).func(job, **job.params)
+    except Exception as exc:
+        logger.exception('Job %s (%s) failed, attempt %s', job.pk, job.kind, job.attempts)
+        job.error = f'{type(exc).__name__}: {exc}'
+        if job.attempts < job.max_attempts:
+            job.status = 'QUEUED'
+            job.available_at = timezone.now() + retry_delay(job.attempts)
+        else:
+            job.status = 'FAILED'
+            job.finished_at = timezone.now()
+    else:
+        job.status = 'SUCCEEDED'
+        job.result = result
+        job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'result', 'error', 'available_at', 'finished_at'])
+    return job
+
+
+class ExportJobParams(serializers.Serializer):
+    kind = serializers.ChoiceField(choices=['loans', 'history'])
+    format = serializers.ChoiceField(choices=FORMATS, default='csv')
+
+
+class ArchiveJobParams(serializers.Serializer):
+    kind = serializers.ChoiceField(choices=list(ARCHIVE_KINDS), required=False)
+    horizon_days = serializers.IntegerField(min_value=0, required=False)
+
+
+# Rows written between progress reports of an export
+EXPORT_REPORT_EVERY = EXPORT_CHUNK_SIZE * 5
+
+EXPORTS = {
+    'loans': (Loan.objects.order_by('-loan_date', '-id'), LOAN_COLUMNS),
+    'history': (LoanHistory.objects.order_by('-action_date', '-id'), HISTORY_COLUMNS),
+}
+
+
+# A rerun would import the file again, so imports are never retried
+@task('import_catalog', max_attempts=1)
+def import_catalog(job, kind, file, format):
+    """Import an uploaded file saved under JOBS_DIR, then delete it"""
+    path = job_path(file)
+    try:
+        with open(path, encoding='utf-8', newline='') as stream:
+            return CatalogImporter(kind, progress=job.report).run(read_records(stream, format))
+    finally:
+        path.unlink(missing_ok=True)
+
+
+@task('export', params=ExportJobParams)
+def export(job, kind, format):
+    """Write every loan or history row to a file for GET /api/jobs/{id}/download/"""
+    queryset, columns = EXPORTS[kind]
+    headers = [header for header, _ in columns]
+    encode = CSVEncoder(headers) if format == 'csv' else JSONLinesEncoder(headers)
+    progress = {'rows': 0}
+
+    def counted(rows):
+        for row in rows:
+            yield row
+            progress['rows'] += 1
+            if progress['rows'] % EXPORT_REPORT_EVERY == 0:
+                job.report(progress)
+
+    name = f'{kind}-{timezone.localdate():%Y%m%d}-{job.id}.{format}'
+    rows = queryset.values_list(*[lookup for _, lookup in columns]).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    with open(job_path(name), 'w', encoding='utf-8', newline='') as handle:
+        for piece in encode_rows(counted(rows), encode):
+            handle.write(piece)
+    return {'file': name, 'format': format, 'rows': progress['rows']}
+
+
+@task('rebuild_counters', params=serializers.Serializer)
+def rebuild_counters(job):
+    """Run `manage.py rebuild_counters` and keep what it printed"""
+    out = io.StringIO()
+    # The rebuild is one transaction, so it cannot report progress as it goes
+    with Heartbeat(job):
+        call_command('rebuild_counters', stdout=out)
+    return {'output': out.getvalue().splitlines()}
+
+
+@task('archive_circulation', params=ArchiveJobParams)
+def archive_circulation(job, kind=None, horizon_days=None):
+    """Archive old loans and/or history as `manage.py archive_circulation` does"""
+    if horizon_days is None:
+        horizon_days = settings.ARCHIVE_HORIZON_DAYS
+    before = timezone.localdate() - timedelta(days=horizon_days)
+    result = {}
+    for name in [kind] if kind else ARCHIVE_KINDS:
+        result[name] = Archiver(name, progress=lambda summary: job.report({**result, name: summary})).run(before)
+    return result
+
+
+@task('sweep_overdue', params=serializers.Serializer)
+def sweep_overdue(job):
+    """Mark newly overdue loans as `manage.py sweep_overdue` does"""
+    return OverdueSweeper(progress=job.report).run()
+
+
+def save_upload(upload, suffix):
+    """Copy an uploaded file to JOBS_DIR; returns the name to pass to the job"""
+    name = f'upload-{uuid.uuid4()}.{suffix}'
+    with open(job_path(name), 'wb') as handle:
+        for chunk in upload.chunks():
+            handle.write(chunk)
+    return name
@@ -0,0 +1,42 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from api.archive import KINDS, Archiver
+
+
+class Command(BaseCommand):
+    help = 'Move returned loans and loan history older than the archive horizon into archive files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=list(KINDS), help='Defaults to both')
+        parser.add_argument(
+            '--horizon-days', type=int,
+            help='Archive rows dated more than this many days ago (default: ARCHIVE_HORIZON_DAYS)'
+        )
+        parser.add_argument('--batch-size', type=int, help='Rows per file and transaction (default: ARCHIVE_BATCH_SIZE)')
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches per kind')
+
+    def handle(self, *args, **options):
+        horizon = options['horizon_days']
+        if horizon is None:
+            horizon = settings.ARCHIVE_HORIZON_DAYS
+        if horizon < 0:
+            raise CommandError('--horizon-days cannot be negative')
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        before = timezone.localdate() - timedelta(days=horizon)
+        for kind in [options['kind']] if options['kind'] else KINDS:
+            try:
+                archiver = Archiver(kind, batch_size=options['batch_size'], progress=self.report_progress)
+            except ImproperlyConfigured as exc:
+                raise CommandError(str(exc))
+            summary = archiver.run(before, max_batches=options['max_batches'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Archived {summary['rows']} {kind} rows dated before {before} in {summary['batches']} files"
+            ))
+
+    def report_progress(self, summary):
+        self.stdout.write(f"Archived {summary['rows']} rows in {summary['batches']} files")
@@ -0,0 +1,129 @@
+import io
+import random
+import statistics
+import time
+from datetime import timedelta
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from accounts.models import Member
+from api.cache import invalidate_catalog
+from api.models import Book, Loan, LoanHistory
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = 'Time the query shapes used by the API list endpoints and report p50/p95 latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help='Insert this many synthetic loans first')
+        parser.add_argument('--runs', type=int, default=200, help='Executions per query shape')
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.seed(options['seed'])
+
+        rng = random.Random(0)
+        member_ids = list(Member.objects.values_list('id', flat=True)[:1000])
+        book_ids = list(Book.objects.values_list('id', flat=True)[:1000])
+        categories = list(Book.objects.values_list('category', flat=True).distinct()[:50])
+        if not (member_ids and book_ids):
+            self.stderr.write('No data to benchmark, pass --seed N')
+            return
+
+        today = timezone.now().date()
+        loans = Loan.objects.select_related('book', 'member')
+        history = LoanHistory.objects.select_related('book', 'member')
+        shapes = {
+            'loans: page': lambda: loans.order_by('-loan_date')[:10],
+            'loans: status=LOANED': lambda: loans.filter(status='LOANED').order_by('-loan_date')[:10],
+            'loans: member + status': lambda: loans.filter(
+                member_id=rng.choice(member_ids), status='LOANED')[:10],
+            'loans: book + status': lambda: loans.filter(
+                book_id=rng.choice(book_ids), status='LOANED')[:10],
+            'history: page': lambda: history.order_by('-action_date')[:10],
+            'history: date range': lambda: history.filter(
+                action_date__gte=today - timedelta(days=rng.randint(1, 365)),
+                action_date__lte=today).order_by('-action_date')[:10],
+            'history: member': lambda: history.filter(
+                member_id=rng.choice(member_ids)).order_by('-action_date')[:10],
+            'books: page': lambda: Book.objects.order_by('title')[:10],
+            'books: available': lambda: Book.objects.filter(availability=True).order_by('title')[:10],
+            'books: category': lambda: Book.objects.filter(
+                category=rng.choice(categories)).order_by('title')[:10],
+            'members: page': lambda: Member.objects.order_by('name')[:10],
+        }
+
+        self.stdout.write(f"{'query':<26}{'p50 ms':>10}{'p95 ms':>10}")
+        for name, build in shapes.items():
+            timings = []
+            for _ in range(options['runs']):
+                queryset = build()
+                started = time.perf_counter()
+                list(queryset)
+                timings.append((time.perf_counter() - started) * 1000)
+            p50 = statistics.median(timings)
+            p95 = statistics.quantiles(timings, n=20)[-1]
+            self.stdout.write(f"{name:<26}{p50:>10.2f}{p95:>10.2f}")
+
+    def seed(self, loan_count):
+        """Bulk insert synthetic members, books, loans and history"""
+        rng = random.Random(0)
+        today = timezone.now().date()
+        offset = Member.objects.count()
+        member_count = max(1, loan_count // 20)
+        book_count = max(1, loan_count // 5)
+
+        members = [
+            Member(name=f'Member {offset + i}', cpf=f'{offset + i:011d}', email=f'member{offset + i}@bench.local')
+            for i in range(member_count)
+        ]
+        Member.objects.bulk_create(members, batch_size=BATCH_SIZE)
+        books = [
+            Book(title=f'Book {i}', category=f'Category {i % 40}')
+            for i in range(book_count)
+        ]
+        Book.objects.bulk_create(books, batch_size=BATCH_SIZE)
+
+        # The most recent loan of one book in ten is still out; the rest were returned
+        out_books = set()
+        for start in range(0, loan_count, BATCH_SIZE):
+            loans = []
+            entries = []
+            for i in range(start, min(start + BATCH_SIZE, loan_count)):
+                book = books[i % book_count]
+                member = rng.choice(members)
+                loan_date = today - timedelta(days=(loan_count - i) * 3650 // loan_count)
+                loaned = i + book_count // 10 >= loan_count and book.pk not in out_books
+                if loaned:
+                    out_books.add(book.pk)
+                loans.append(Loan(
+                    book=book,
+                    member=member,
+                    loan_date=loan_date,
+                    due_date=loan_date + timedelta(days=14),
+                    return_date=None if loaned else loan_date + timedelta(days=14),
+                    status='LOANED' if loaned else 'RETURNED',
+                ))
+                entries.append(LoanHistory(
+                    book=book,
+                    member=member,
+                    action_type='LOANED',
+                    action_date=loan_date,
+                ))
+            Loan.objects.bulk_create(loans)
+            LoanHistory.objects.bulk_create(entries)
+            self.stdout.write(f'Seeded {min(start + BATCH_SIZE, loan_count)}/{loan_count} loans')
+
+        Book.objects.filter(
+            pk__in=Loan.objects.filter(status='LOANED').values('book_id')
+        ).update(availability=False)
+
+        # bulk_create skips the model save() hooks, so bring the circulation
+        # counters and the catalog cache up to date with the seeded rows. Only
+        # the summary is shown: the drift report lists every seeded member.
+        report = io.StringIO()
+        call_command('rebuild_counters', stdout=report)
+        self.stdout.write(report.getvalue().splitlines()[-1])
+        invalidate_catalog()
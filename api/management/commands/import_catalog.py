@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.importers import CHUNK_SIZE, FORMATS, CatalogImporter, ImportAborted, guess_format, read_records
+
+
+class Command(BaseCommand):
+    help = 'Stream books or members from a CSV/JSONL file into the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=['books', 'members'])
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or guess_format(options['path'])
+        importer = CatalogImporter(
+            options['kind'],
+            chunk_size=options['chunk_size'],
+            progress=self.report_progress
+        )
+
+        try:
+            with open(options['path'], encoding='utf-8', newline='') as stream:
+                summary = importer.run(read_records(stream, fmt))
+        except OSError as exc:
+            raise CommandError(f"Could not read {options['path']}: {exc}")
+        except ImportAborted as exc:
+            self.write_errors(exc.summary)
+            raise CommandError(str(exc))
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        self.write_errors(summary)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {summary['created']} {options['kind']} "
+            f"({summary['invalid']} invalid, {summary['skipped']} duplicates)"
+        ))
+
+    def write_errors(self, summary):
+        for error in summary['errors']:
+            self.stderr.write(f"Row {error['row']}: {error['detail']}")
+
+    def report_progress(self, summary):
+        self.stdout.write(f"Processed {summary['processed']} rows, created {summary['created']}")
@@ -0,0 +1,241 @@
+import http.client
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import threading
+import time
+import uuid
+from collections import defaultdict
+from urllib.parse import urlencode, urlsplit
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from accounts.authentication import tokens_for_user
+from accounts.models import Member, User
+from api.models import Book
+
+# Relative frequency of each scenario, roughly a staffed circulation desk
+SCENARIOS = {
+    'books: browse': 20,
+    'books: search': 10,
+    'books: detail': 15,
+    'loans: active': 10,
+    'loans: member': 5,
+    'history: cursor': 10,
+    'members: search': 10,
+    'stats': 5,
+    'checkout + return': 12,
+    'login': 3,
+}
+SEARCH_TERMS = ('book', 'the', 'science', 'history', 'art', '123')
+SERVER_START_TIMEOUT = 30
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay a weighted mix of circulation traffic against a server and report '
+        'throughput and latency per scenario'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Server to load (ignored with --serve)')
+        parser.add_argument('--serve', action='store_true', help='Start gunicorn with the settings below first')
+        parser.add_argument('--server-mode', choices=('wsgi', 'asgi'), help='SERVER_MODE for --serve')
+        parser.add_argument('--workers', type=int, help='WEB_CONCURRENCY for --serve')
+        parser.add_argument('--threads', type=int, help='GUNICORN_THREADS for --serve')
+        parser.add_argument('--worker-class', help='GUNICORN_WORKER_CLASS for --serve')
+        parser.add_argument('--concurrency', type=int, default=16, help='Simultaneous clients')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to run')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        books = list(Book.objects.filter(availability=True).values_list('id', flat=True)[:1000])
+        members = list(Member.objects.values_list('id', flat=True)[:1000])
+        if not books or not members:
+            raise CommandError('Need available books and members to replay traffic, see benchmark_queries --seed')
+
+        password = uuid.uuid4().hex
+        user = User.objects.create_user(
+            login=f'loadtest-{uuid.uuid4().hex[:8]}',
+            email=f'{uuid.uuid4().hex[:8]}@loadtest.local',
+            name='Load Test',
+            role='Load Test',
+            password=password,
+            is_staff_member=True
+        )
+        server = None
+        try:
+            url = options['url']
+            if options['serve']:
+                server, url = self.start_server(options)
+            token = str(tokens_for_user(user).access_token)
+            # Only browse pages the catalog is known to fill
+            pages = max(1, min(5, len(books) // settings.REST_FRAMEWORK['PAGE_SIZE']))
+            client = LoadClient(url, token, user.login, password, books, members, pages)
+            results = self.run(client, options)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+            user.delete()
+
+        self.report(results, options['duration'])
+
+    def start_server(self, options):
+        """Start gunicorn from gunicorn.conf.py on a free local port and wait for /health/"""
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+
+        env = dict(os.environ)
+        for option, variable in (
+            ('server_mode', 'SERVER_MODE'),
+            ('workers', 'WEB_CONCURRENCY'),
+            ('threads', 'GUNICORN_THREADS'),
+            ('worker_class', 'GUNICORN_WORKER_CLASS'),
+        ):
+            if options[option] is not None:
+                env[variable] = str(options[option])
+
+        server = subprocess.Popen(
+            ['gunicorn', '--config', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}', '--log-level', 'warning'],
+            cwd=settings.BASE_DIR,
+            env=env
+        )
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while time.monotonic() < deadline:
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+                connection.request('GET', '/health/')
+                if connection.getresponse().status == 200:
+                    return server, f'http://127.0.0.1:{port}'
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError('gunicorn did not start')
+
+    def run(self, client, options):
+        """Run the clients until the duration elapses; return {scenario: [(ms, ok), ...]}"""
+        results = defaultdict(list)
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['duration']
+        names, weights = zip(*SCENARIOS.items())
+
+        def worker(index):
+            rng = random.Random(options['seed'] + index)
+            session = client.session()
+            while time.monotonic() < deadline:
+                name = rng.choices(names, weights)[0]
+                started = time.perf_counter()
+                try:
+                    ok = session.play(name, rng)
+                except OSError:
+                    ok = False
+                    session = client.session()
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    results[name].append((elapsed, ok))
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def report(self, results, duration):
+        self.stdout.write(f"{'scenario':<20}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}")
+        total = errors = 0
+        for name in SCENARIOS:
+            samples = results.get(name, [])
+            if not samples:
+                continue
+            timings = [ms for ms, ok in samples]
+            failed = sum(1 for ms, ok in samples if not ok)
+            p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+            self.stdout.write(
+                f'{name:<20}{len(samples):>8}{failed:>8}{statistics.median(timings):>10.1f}{p95:>10.1f}'
+            )
+            total += len(samples)
+            errors += failed
+        self.stdout.write(f'Total: {total} scenarios, {total / duration:.1f}/sec, {errors} errors')
+
+
+class LoadClient:
+    """What the load test sessions share: target, credentials and ids to request"""
+    def __init__(self, url, token, login, password, books, members, pages):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.token = token
+        self.login = login
+        self.password = password
+        self.books = books
+        self.members = members
+        self.pages = pages
+
+    def session(self):
+        return LoadSession(self)
+
+
+class LoadSession:
+    """One keep-alive connection playing scenarios for one simulated client"""
+    def __init__(self, client):
+        self.client = client
+        self.connection = http.client.HTTPConnection(client.host, client.port, timeout=60)
+
+    def request(self, method, path, params=None, body=None, auth=True):
+        if params:
+            path = f'{path}?{urlencode(params)}'
+        headers = {'Content-Type': 'application/json'}
+        if auth:
+            headers['Authorization'] = f'Bearer {self.client.token}'
+        payload = json.dumps(body) if body is not None else None
+        self.connection.request(method, path, body=payload, headers=headers)
+        response = self.connection.getresponse()
+        data = response.read()
+        return response.status, data
+
+    def play(self, name, rng):
+        """Run one scenario; True when every request in it succeeded"""
+        client = self.client
+        if name == 'books: browse':
+            status, _ = self.request('GET', '/api/books/', {'page': rng.randint(1, client.pages)})
+        elif name == 'books: search':
+            status, _ = self.request('GET', '/api/books/', {'search': rng.choice(SEARCH_TERMS)})
+        elif name == 'books: detail':
+            status, _ = self.request('GET', f'/api/books/{rng.choice(client.books)}/')
+        elif name == 'loans: active':
+            status, _ = self.request('GET', '/api/loans/', {'status': 'LOANED'})
+        elif name == 'loans: member':
+            status, _ = self.request('GET', '/api/loans/', {'member': rng.choice(client.members)})
+        elif name == 'history: cursor':
+            status, _ = self.request('GET', '/api/history/', {'cursor': ''})
+        elif name == 'members: search':
+            status, _ = self.request('GET', '/api/accounts/members/', {'search': rng.choice(SEARCH_TERMS)})
+        elif name == 'stats':
+            status, _ = self.request('GET', '/api/stats/')
+        elif name == 'login':
+            status, _ = self.request(
+                'POST', '/api/accounts/users/login/',
+                body={'login': client.login, 'password': client.password},
+                auth=False
+            )
+        else:
+            return self.checkout_and_return(rng)
+        return status == 200
+
+    def checkout_and_return(self, rng):
+        book = str(rng.choice(self.client.books))
+        member = str(rng.choice(self.client.members))
+        status, data = self.request('POST', '/api/loans/', body={'book': book, 'member': member})
+        if status == 400:
+            # Another client holds this book right now; that is expected traffic
+            return True
+        if status != 201:
+            return False
+        loan = json.loads(data)['id']
+        status, _ = self.request('PATCH', f'/api/loans/{loan}/return_book/')
+        return status == 200
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from api.partitions import add_months, create_partitions, detach_partitions, is_partitioned
+
+
+class Command(BaseCommand):
+    help = (
+        'Create the upcoming monthly loan history partitions and detach the months '
+        'older than --retain-months'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=3, help='Months to create partitions for in advance')
+        parser.add_argument(
+            '--retain-months', type=int,
+            help='Keep the current month and this many before it, detach older ones (default: keep all)'
+        )
+        parser.add_argument('--drop', action='store_true', help='Drop detached months instead of keeping their tables')
+
+    def handle(self, *args, **options):
+        if options['ahead'] < 0:
+            raise CommandError('--ahead cannot be negative')
+        if options['retain_months'] is not None and options['retain_months'] < 0:
+            raise CommandError('--retain-months cannot be negative')
+        if options['drop'] and options['retain_months'] is None:
+            raise CommandError('--drop needs --retain-months')
+
+        today = timezone.localdate()
+        if is_partitioned():
+            created = create_partitions(options['ahead'], today)
+            for name, moved in created:
+                suffix = f' ({moved} rows moved from the default partition)' if moved else ''
+                self.stdout.write(f'Created {name}{suffix}')
+            self.stdout.write(self.style.SUCCESS(f'Created {len(created)} history partitions'))
+        else:
+            self.stdout.write(f'History is not partitioned on {connection.vendor}, no partitions to create')
+
+        if options['retain_months'] is not None:
+            before = add_months(today.replace(day=1), -options['retain_months'])
+            detached = detach_partitions(before, drop=options['drop'])
+            action = 'Dropped' if options['drop'] else 'Detached'
+            for name in detached:
+                self.stdout.write(f'{action} {name}')
+            self.stdout.write(self.style.SUCCESS(f'{action} {len(detached)} months of history before {before}'))
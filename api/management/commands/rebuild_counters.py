@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from api.models import Book, CategoryCounter, Loan, MemberCounter
+
+
+class Command(BaseCommand):
+    help = 'Recompute the category and member circulation counters and report any drift'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            # Lock the counters before aggregating, so a checkout or return
+            # cannot commit between the two and be counted on only one side
+            stored_categories, stored_members = self.lock_counters()
+
+            categories = {
+                row['category']: (row['available'], row['loaned'])
+                for row in Book.objects.values('category').annotate(
+                    available=Count('id', filter=Q(availability=True)),
+                    loaned=Count('id', filter=Q(availability=False)),
+                ).order_by()
+            }
+            members = dict(
+                Loan.objects.filter(status='LOANED').values_list('member_id').annotate(
+                    active_loans=Count('id')
+                ).order_by()
+            )
+
+            drifted_categories = self.report_drift('category', stored_categories, categories, (0, 0))
+            drifted_members = self.report_drift('member', stored_members, members, 0)
+
+            CategoryCounter.objects.all().delete()
+            CategoryCounter.objects.bulk_create([
+                CategoryCounter(category=category, available=available, loaned=loaned)
+                for category, (available, loaned) in categories.items()
+            ])
+            MemberCounter.objects.all().delete()
+            MemberCounter.objects.bulk_create([
+                MemberCounter(member_id=member_id, active_loans=active_loans)
+                for member_id, active_loans in members.items()
+            ])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {len(categories)} category and {len(members)} member counters '
+            f'({drifted_categories} categories and {drifted_members} members had drifted)'
+        ))
+
+    def lock_counters(self):
+        """Block counter writes until the transaction ends and return the stored values"""
+        if connection.vendor == 'postgresql':
+            # Row locks would miss counters created after they were taken;
+            # EXCLUSIVE mode holds off every writer but still lets /api/stats/ read
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'LOCK TABLE {CategoryCounter._meta.db_table}, {MemberCounter._meta.db_table} '
+                    'IN EXCLUSIVE MODE'
+                )
+        stored_categories = {
+            counter.category: (counter.available, counter.loaned)
+            for counter in CategoryCounter.objects.select_for_update()
+        }
+        stored_members = dict(
+            MemberCounter.objects.select_for_update().values_list('member_id', 'active_loans')
+        )
+        return stored_categories, stored_members
+
+    def report_drift(self, label, stored, actual, empty):
+        drifted = 0
+        for key in stored.keys() | actual.keys():
+            before = stored.get(key, empty)
+            after = actual.get(key, empty)
+            if before != after:
+                drifted += 1
+                self.stdout.write(f'{label} {key}: {before} -> {after}')
+        return drifted
@@ -0,0 +1,46 @@
+import signal
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from api import jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (imports, exports, counter rebuilds, archiving)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float,
+            help='Seconds to wait when no job is due (default: JOB_POLL_INTERVAL)'
+        )
+        parser.add_argument('--once', action='store_true', help='Exit once no job is due instead of waiting')
+
+    def handle(self, *args, **options):
+        interval = options['interval'] if options['interval'] is not None else settings.JOB_POLL_INTERVAL
+        if interval < 0:
+            raise CommandError('--interval cannot be negative')
+
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        finished = 0
+        while not self.stopping:
+            jobs.requeue_stale()
+            job = jobs.claim()
+            if job is not None:
+                jobs.run(job)
+                finished += 1
+                self.stdout.write(f'Job {job.pk} ({job.kind}): {job.status}')
+            elif options['once']:
+                break
+            else:
+                # Long-running process: drop connections past CONN_MAX_AGE or broken
+                close_old_connections()
+                time.sleep(interval)
+        self.stdout.write(self.style.SUCCESS(f'Job worker stopped after {finished} jobs'))
+
+    def stop(self, signum, frame):
+        # Finish the current job, then exit
+        self.stopping = True
@@ -0,0 +1,49 @@
+import signal
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from api import outbox
+
+
+class Command(BaseCommand):
+    help = 'Hand outbox events (loan checkouts and returns) to their registered handlers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Events per transaction (default: OUTBOX_BATCH_SIZE)')
+        parser.add_argument(
+            '--interval', type=float,
+            help='Seconds to wait when no event is due (default: OUTBOX_POLL_INTERVAL)'
+        )
+        parser.add_argument('--once', action='store_true', help='Exit once no event is due instead of waiting')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size'] or settings.OUTBOX_BATCH_SIZE
+        interval = options['interval'] if options['interval'] is not None else settings.OUTBOX_POLL_INTERVAL
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+        if interval < 0:
+            raise CommandError('--interval cannot be negative')
+
+        outbox.autodiscover()
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        total = 0
+        while not self.stopping:
+            taken = outbox.drain(batch_size)
+            total += taken
+            if taken:
+                self.stdout.write(f'Processed {taken} events')
+            elif options['once']:
+                break
+            else:
+                # Long-running process: drop connections past CONN_MAX_AGE or broken
+                close_old_connections()
+                time.sleep(interval)
+        self.stdout.write(self.style.SUCCESS(f'Outbox worker stopped after {total} events'))
+
+    def stop(self, signum, frame):
+        # Finish the current batch, then exit
+        self.stopping = True
@@ -0,0 +1,31 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from api.overdue import OverdueSweeper
+
+
+class Command(BaseCommand):
+    help = 'Mark loans past their due date as overdue and queue a loan.overdue event for each'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Loans per transaction (default: OVERDUE_SWEEP_BATCH_SIZE)')
+        parser.add_argument('--date', help='Sweep as of this YYYY-MM-DD date instead of today')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        today = None
+        if options['date']:
+            try:
+                today = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError('--date must be YYYY-MM-DD')
+
+        sweeper = OverdueSweeper(batch_size=options['batch_size'], progress=self.report_progress)
+        summary = sweeper.run(today)
+        self.stdout.write(self.style.SUCCESS(
+            f"Marked {summary['marked']} newly overdue loans in {summary['batches']} batches "
+            f"({summary['overdue']} loans overdue)"
+        ))
+
+    def report_progress(self, summary):
+        self.stdout.write(f"Marked {summary['marked']} loans in {summary['batches']} batches")
@@ -0,0 +1,88 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:59
+
+import logging
+from datetime import date
+from django.db import migrations, models
+from django.db.models import Count
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_duplicate_active_loans(apps, schema_editor):
+    """
+    Keep only the newest LOANED loan of each book and mark the others
+    RETURNED, so that api_loan_one_active_per_book can be created.
+    """
+    Loan = apps.get_model('api', 'Loan')
+    books = list(
+        Loan.objects.filter(status='LOANED').values('book_id').annotate(active=Count('id'))
+        .filter(active__gt=1).values_list('book_id', flat=True)
+    )
+    for book_id in books:
+        newest, *stale = Loan.objects.filter(book_id=book_id, status='LOANED').order_by(
+            '-loan_date', '-created_at'
+        ).values_list('id', flat=True)
+        Loan.objects.filter(pk__in=stale).update(
+            status='RETURNED', return_date=date.today(), updated_at=timezone.now()
+        )
+        logger.warning(
+            'Book %s had %s active loans: kept %s, marked returned: %s',
+            book_id, len(stale) + 1, newest, ', '.join(str(pk) for pk in stale)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_add_member_name_index'),
+        ('api', '0003_add_action_type_to_history'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['title'], name='api_book_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['category', 'title'], name='api_book_category_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['availability', 'title'], name='api_book_avail_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['-loan_date'], name='api_loan_loan_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['status', '-loan_date'], name='api_loan_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['member', 'status', '-loan_date'], name='api_loan_member_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['book', 'status'], name='api_loan_book_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loanhistory',
+            index=models.Index(fields=['-action_date'], name='api_history_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loanhistory',
+            index=models.Index(fields=['member', '-action_date'], name='api_history_member_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loanhistory',
+            index=models.Index(fields=['book', '-action_date'], name='api_history_book_date_idx'),
+        ),
+        migrations.RunPython(resolve_duplicate_active_loans, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='loan',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'LOANED')), fields=('book',), name='api_loan_one_active_per_book'),
+        ),
+    ]
@@ -0,0 +1,89 @@
+import logging
+from django.db import DatabaseError, migrations, transaction
+
+logger = logging.getLogger(__name__)
+
+# The index as it was when this migration was written; kept literal so that
+# later changes to api.search cannot alter what this migration does
+SQLITE_CREATE = [
+    "CREATE VIRTUAL TABLE api_book_fts USING fts5(id UNINDEXED, title, category, tokenize='trigram')",
+    'INSERT INTO api_book_fts (id, title, category) SELECT id, title, category FROM api_book',
+    (
+        'CREATE TRIGGER api_book_fts_insert AFTER INSERT ON api_book'
+        ' BEGIN INSERT INTO api_book_fts (id, title, category) VALUES (new.id, new.title, new.category); END'
+    ),
+    (
+        'CREATE TRIGGER api_book_fts_update AFTER UPDATE ON api_book'
+        ' WHEN old.title IS NOT new.title OR old.category IS NOT new.category'
+        ' BEGIN UPDATE api_book_fts SET title = new.title, category = new.category WHERE id = old.id; END'
+    ),
+    (
+        'CREATE TRIGGER api_book_fts_delete AFTER DELETE ON api_book'
+        ' BEGIN DELETE FROM api_book_fts WHERE id = old.id; END'
+    ),
+]
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS api_book_fts_insert',
+    'DROP TRIGGER IF EXISTS api_book_fts_update',
+    'DROP TRIGGER IF EXISTS api_book_fts_delete',
+    'DROP TABLE IF EXISTS api_book_fts',
+]
+POSTGRESQL_CREATE = [
+    'CREATE INDEX api_book_title_trgm ON api_book USING gin (title gin_trgm_ops)',
+    'CREATE INDEX api_book_category_trgm ON api_book USING gin (category gin_trgm_ops)',
+]
+POSTGRESQL_DROP = [
+    'DROP INDEX IF EXISTS api_book_title_trgm',
+    'DROP INDEX IF EXISTS api_book_category_trgm',
+]
+
+
+def create_trigram_extension(schema_editor):
+    """Install pg_trgm unless it already is; False if the role is not allowed to"""
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        if cursor.fetchone() is not None:
+            return True
+    try:
+        # A savepoint, so a refusal does not abort the migration's transaction
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except DatabaseError:
+        return False
+    return True
+
+
+def create_search_index(apps, schema_editor):
+    """Create the full-text index backing api.search for this database"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        statements = SQLITE_CREATE
+    elif vendor == 'postgresql':
+        if not create_trigram_extension(schema_editor):
+            logger.warning(
+                'pg_trgm is not installed and could not be created, so api_book gets no search index; '
+                'searches on it scan the table (see "Search indexes" in the README)'
+            )
+            return
+        statements = POSTGRESQL_CREATE
+    else:
+        return
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    statements = {'sqlite': SQLITE_DROP, 'postgresql': POSTGRESQL_DROP}.get(schema_editor.connection.vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_add_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
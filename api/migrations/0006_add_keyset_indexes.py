@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_add_member_search_index'),
+        ('api', '0005_add_book_search_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='loan',
+            name='api_loan_loan_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='loanhistory',
+            name='api_history_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['-loan_date', '-id'], name='api_loan_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loanhistory',
+            index=models.Index(fields=['-action_date', '-id'], name='api_history_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def populate_counters(apps, schema_editor):
+    """Seed the counters from the existing books and loans"""
+    Book = apps.get_model('api', 'Book')
+    Loan = apps.get_model('api', 'Loan')
+    CategoryCounter = apps.get_model('api', 'CategoryCounter')
+    MemberCounter = apps.get_model('api', 'MemberCounter')
+
+    categories = Book.objects.values('category').annotate(
+        available=Count('id', filter=Q(availability=True)),
+        loaned=Count('id', filter=Q(availability=False)),
+    ).order_by()
+    CategoryCounter.objects.bulk_create([CategoryCounter(**row) for row in categories])
+
+    members = Loan.objects.filter(status='LOANED').values('member_id').annotate(
+        active_loans=Count('id')
+    ).order_by()
+    MemberCounter.objects.bulk_create([MemberCounter(**row) for row in members])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_add_member_search_index'),
+        ('api', '0006_add_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryCounter',
+            fields=[
+                ('category', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('available', models.IntegerField(default=0)),
+                ('loaned', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Category Counter',
+                'verbose_name_plural': 'Category Counters',
+                'ordering': ['category'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MemberCounter',
+            fields=[
+                ('member', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='loan_counter', serialize=False, to='accounts.member')),
+                ('active_loans', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Member Counter',
+                'verbose_name_plural': 'Member Counters',
+                'indexes': [models.Index(fields=['-active_loans'], name='api_member_counter_active_idx')],
+            },
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
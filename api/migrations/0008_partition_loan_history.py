@@ -0,0 +1,102 @@
+from datetime import date
+from django.db import migrations
+
+TABLE = 'api_loanhistory'
+MONTHS_AHEAD = 3
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def rebuild_table(schema_editor, partitioned):
+    """
+    Recreate the history table, partitioned by month or as a plain table,
+    keeping its columns, indexes and foreign keys and copying the rows over.
+
+    A primary key on a partitioned table must contain the partition key, so
+    the partitioned table's key is (id, action_date); ids stay unique UUIDs.
+    """
+    old = f'{TABLE}_old'
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes "
+            "WHERE tablename = %s AND indexname <> %s",
+            [TABLE, f'{TABLE}_pkey']
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [TABLE]
+        )
+        foreign_keys = cursor.fetchall()
+
+    # Free the index and constraint names for the new table
+    schema_editor.execute(f'ALTER TABLE {TABLE} RENAME TO {old}')
+    schema_editor.execute(f'ALTER TABLE {old} RENAME CONSTRAINT {TABLE}_pkey TO {old}_pkey')
+    for name, _ in indexes:
+        schema_editor.execute(f'DROP INDEX {name}')
+    for name, _ in foreign_keys:
+        schema_editor.execute(f'ALTER TABLE {old} DROP CONSTRAINT {name}')
+
+    if partitioned:
+        schema_editor.execute(
+            f'CREATE TABLE {TABLE} (LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY RANGE (action_date)'
+        )
+        schema_editor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id, action_date)')
+        create_partitions(schema_editor, old)
+    else:
+        schema_editor.execute(f'CREATE TABLE {TABLE} (LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        schema_editor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id)')
+
+    for _, definition in indexes:
+        schema_editor.execute(definition)
+    for name, definition in foreign_keys:
+        schema_editor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}')
+
+    schema_editor.execute(f'INSERT INTO {TABLE} SELECT * FROM {old}')
+    # Drops the old partitions too when reversing
+    schema_editor.execute(f'DROP TABLE {old} CASCADE')
+
+
+def create_partitions(schema_editor, source):
+    """One partition per month from the oldest row to MONTHS_AHEAD months from now, plus the default"""
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"SELECT date_trunc('month', MIN(action_date))::date FROM {source}")
+        oldest = cursor.fetchone()[0]
+
+    current = date.today().replace(day=1)
+    month = min(oldest, current) if oldest else current
+    last = add_months(current, MONTHS_AHEAD)
+    while month <= last:
+        end = add_months(month, 1)
+        schema_editor.execute(
+            f"CREATE TABLE {TABLE}_{month:%Y_%m} PARTITION OF {TABLE} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{end.isoformat()}')"
+        )
+        month = end
+    schema_editor.execute(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+
+
+def partition_history(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        rebuild_table(schema_editor, partitioned=True)
+
+
+def unpartition_history(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        rebuild_table(schema_editor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_add_circulation_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_history, unpartition_history),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_partition_loan_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('loans', 'Loans'), ('history', 'History')], max_length=10)),
+                ('path', models.CharField(max_length=255, unique=True)),
+                ('first_date', models.DateField()),
+                ('last_date', models.DateField()),
+                ('rows', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Archive Segment',
+                'verbose_name_plural': 'Archive Segments',
+                'ordering': ['kind', 'first_date'],
+                'indexes': [models.Index(fields=['kind', 'first_date'], name='api_archive_kind_date_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedMember',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('member_id', models.UUIDField()),
+                ('rows', models.PositiveIntegerField()),
+                ('first_date', models.DateField()),
+                ('last_date', models.DateField()),
+                ('segment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='members', to='api.archivesegment')),
+            ],
+            options={
+                'verbose_name': 'Archived Member',
+                'verbose_name_plural': 'Archived Members',
+                'constraints': [models.UniqueConstraint(fields=('member_id', 'segment'), name='api_archived_member_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:55
+
+from datetime import timedelta
+from django.db import migrations, models
+
+
+def backfill_due_dates(apps, schema_editor):
+    """Give existing loans the 14-day loan period in force when due dates were added"""
+    Loan = apps.get_model('api', 'Loan')
+    # Fixed here rather than read from settings, so the backfill does not
+    # depend on the configuration of whoever runs the migration
+    period = timedelta(days=14)
+    # One UPDATE per loan date works on every backend and rides the loan_date index
+    loan_dates = list(
+        Loan.objects.filter(due_date__isnull=True).values_list('loan_date', flat=True).distinct().order_by()
+    )
+    for loan_date in loan_dates:
+        Loan.objects.filter(loan_date=loan_date, due_date__isnull=True).update(due_date=loan_date + period)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_add_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loan',
+            name='due_date',
+            field=models.DateField(null=True),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='marked_overdue_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_due_dates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='loan',
+            name='due_date',
+            field=models.DateField(),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(condition=models.Q(('status', 'LOANED')), fields=['status', 'due_date', 'id'], name='api_loan_overdue_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_add_loan_due_date'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='outboxevent',
+            name='api_outbox_available_idx',
+        ),
+        migrations.AlterField(
+            model_name='outboxevent',
+            name='available_at',
+            field=models.DateTimeField(blank=True, default=django.utils.timezone.now, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='outboxevent',
+            index=models.Index(condition=models.Q(('available_at__isnull', False)), fields=['available_at', 'id'], name='api_outbox_available_idx'),
+        ),
+    ]
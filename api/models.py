@@ -1,7 +1,11 @@
 import uuid
-from django.db import models
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
 from django.utils import timezone
 from accounts.models import Member
+from .cache import invalidate_catalog
+from .events import loan_events, publish_on_commit
+from .policies import get_due_date_policy
 
 
 def get_today():
@@ -22,6 +26,36 @@ class Book(models.Model):
         verbose_name = 'Book'
         verbose_name_plural = 'Books'
         ordering = ['title']
+        indexes = [
+            models.Index(fields=['title'], name='api_book_title_idx'),
+            models.Index(fields=['category', 'title'], name='api_book_category_title_idx'),
+            models.Index(fields=['availability', 'title'], name='api_book_avail_title_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored values so save() can adjust the category counters
+        instance._loaded_counts = (instance.__dict__.get('category'), instance.__dict__.get('availability'))
+        return instance
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            invalidate_catalog()
+            previous = getattr(self, '_loaded_counts', (None, None))
+            if previous != (self.category, self.availability):
+                if previous[0] is not None:
+                    CategoryCounter.adjust_for_book(*previous, delta=-1)
+                CategoryCounter.adjust_for_book(self.category, self.availability, delta=1)
+                self._loaded_counts = (self.category, self.availability)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            invalidate_catalog()
+            CategoryCounter.adjust_for_book(self.category, self.availability, delta=-1)
+        return result
 
     def __str__(self):
         return f"{self.title} - {'Available' if self.availability else 'Loaned'}"
@@ -46,12 +80,16 @@ class Loan(models.Model):
         related_name='loans'
     )
     loan_date = models.DateField(default=get_today)
+    # Set from settings.LOAN_DUE_DATE_POLICY when the loan is made
+    due_date = models.DateField()
     return_date = models.DateField(null=True, blank=True)
     status = models.CharField(
         max_length=10,
         choices=STATUS_CHOICES,
         default='LOANED'
     )
+    # When `manage.py sweep_overdue` first found the loan overdue
+    marked_overdue_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -59,43 +97,137 @@ class Loan(models.Model):
         verbose_name = 'Loan'
         verbose_name_plural = 'Loans'
         ordering = ['-loan_date']
+        indexes = [
+            models.Index(fields=['-loan_date', '-id'], name='api_loan_date_id_idx'),
+            models.Index(fields=['status', '-loan_date'], name='api_loan_status_date_idx'),
+            models.Index(fields=['member', 'status', '-loan_date'], name='api_loan_member_status_idx'),
+            models.Index(fields=['book', 'status'], name='api_loan_book_status_idx'),
+            # Only loans still out can be overdue, so the index covers just those.
+            # The leading status lets SQLite pick it without planner statistics
+            models.Index(
+                fields=['status', 'due_date', 'id'],
+                condition=models.Q(status='LOANED'),
+                name='api_loan_overdue_idx'
+            ),
+        ]
+        constraints = [
+            # A book can only be out on one loan at a time
+            models.UniqueConstraint(
+                fields=['book'],
+                condition=models.Q(status='LOANED'),
+                name='api_loan_one_active_per_book',
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so save() can detect a return transition
+        # without re-reading the row
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
 
     def save(self, *args, **kwargs):
-        # Check if this is a new loan by looking at the database
         is_new = self._state.adding
-        
-        if is_new:
-            if not self.book.availability:
-                raise ValueError("Book is not available for loan")
-        
+        is_return = (
+            not is_new
+            and self.status == 'RETURNED'
+            and getattr(self, '_loaded_status', 'LOANED') == 'LOANED'
+        )
+
         # Handle return logic
         if self.status == 'RETURNED' and not self.return_date:
             self.return_date = timezone.now().date()
-        
-        super().save(*args, **kwargs)
-        
-        # Update book availability after saving
-        if is_new:
-            self.book.availability = False
-            self.book.save()
-        elif self.status == 'RETURNED':
-            self.book.availability = True
-            self.book.save()
-        
-        # Create loan history entry
-        LoanHistory.objects.create(
-            book=self.book,
-            member=self.member,
-            action_type=self.status,
-            action_date=self.return_date if self.status == 'RETURNED' else self.loan_date
+
+        if is_new and self.due_date is None:
+            self.due_date = get_due_date_policy().due_date(self)
+
+        with transaction.atomic():
+            if is_new:
+                self._claim_book()
+                super().save(*args, **kwargs)
+            elif is_return:
+                self._save_return()
+            elif self.status == 'LOANED' and getattr(self, '_loaded_status', 'LOANED') == 'RETURNED':
+                raise ValueError("A returned loan cannot be lent again.")
+            else:
+                # Status and return date only change through the checkout and
+                # return paths above; leaving them out keeps a stale instance
+                # from undoing a return made since it was loaded
+                update_fields = kwargs.pop('update_fields', None)
+                if update_fields is None:
+                    update_fields = [field.name for field in self._meta.concrete_fields if not field.primary_key]
+                super().save(*args, update_fields=[
+                    name for name in update_fields if name not in ('status', 'return_date')
+                ], **kwargs)
+                return
+
+            # Create loan history entry
+            LoanHistory.objects.create(
+                book_id=self.book_id,
+                member_id=self.member_id,
+                action_type=self.status,
+                action_date=self.return_date if self.status == 'RETURNED' else self.loan_date
+            )
+            OutboxEvent.for_loan(self).save()
+            publish_on_commit(loan_events(self))
+
+        self._loaded_status = self.status
+
+    def _claim_book(self):
+        """Flip the book to unavailable, failing if another loan got it first"""
+        # A conditional UPDATE is atomic in the database, so two concurrent
+        # checkouts of the same book can never both succeed
+        claimed = Book.objects.filter(pk=self.book_id, availability=True).update(
+            availability=False,
+            updated_at=timezone.now()
+        )
+        if not claimed:
+            raise ValueError("Book is not available for loan")
+        self._set_cached_availability(False)
+        invalidate_catalog()
+        CategoryCounter.adjust(self.book.category, available=-1, loaned=1)
+        MemberCounter.adjust(self.member_id, 1)
+
+    def _save_return(self):
+        """Persist a LOANED -> RETURNED transition and release the book"""
+        self.updated_at = timezone.now()
+        values = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+            if not field.primary_key
+        }
+        returned = Loan.objects.filter(pk=self.pk, status='LOANED').update(**values)
+        if not returned:
+            raise ValueError("This loan has already been returned.")
+
+        Book.objects.filter(pk=self.book_id).update(
+            availability=True,
+            updated_at=timezone.now()
         )
+        self._set_cached_availability(True)
+        invalidate_catalog()
+        CategoryCounter.adjust(self.book.category, available=1, loaned=-1)
+        MemberCounter.adjust(self.member_id, -1)
+
+    def _set_cached_availability(self, available):
+        """Keep an already-loaded book instance in sync with the database"""
+        if Loan.book.is_cached(self):
+            self.book.availability = available
+            self.book._loaded_counts = (self.book.category, available)
 
     def __str__(self):
         return f"{self.book.title} - {self.member.name} ({self.status})"
 
 
 class LoanHistory(models.Model):
-    """Model for loan history tracking"""
+    """
+    Model for loan history tracking.
+
+    Rows are only ever appended. On PostgreSQL the table is partitioned by
+    month of `action_date` (see api/partitions.py), so its primary key in the
+    database is (id, action_date).
+    """
     ACTION_CHOICES = [
         ('LOANED', 'Loaned'),
         ('RETURNED', 'Returned'),
@@ -124,6 +256,248 @@ class LoanHistory(models.Model):
         verbose_name = 'Loan History'
         verbose_name_plural = 'Loan History'
         ordering = ['-action_date']
+        indexes = [
+            models.Index(fields=['-action_date', '-id'], name='api_history_date_id_idx'),
+            models.Index(fields=['member', '-action_date'], name='api_history_member_date_idx'),
+            models.Index(fields=['book', '-action_date'], name='api_history_book_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.book.title} - {self.member.name} ({self.action_date})"
+
+
+class CategoryCounter(models.Model):
+    """Maintained count of available and loaned books per category"""
+    category = models.CharField(max_length=100, primary_key=True)
+    available = models.IntegerField(default=0)
+    loaned = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Category Counter'
+        verbose_name_plural = 'Category Counters'
+        ordering = ['category']
+
+    @classmethod
+    def adjust(cls, category, available=0, loaned=0):
+        """Add the given deltas to a category, creating its row on first use"""
+        updated = cls.objects.filter(category=category).update(
+            available=models.F('available') + available,
+            loaned=models.F('loaned') + loaned
+        )
+        if not updated:
+            try:
+                with transaction.atomic():
+                    cls.objects.create(category=category, available=available, loaned=loaned)
+            except IntegrityError:
+                # Another transaction created the row first
+                cls.adjust(category, available, loaned)
+
+    @classmethod
+    def adjust_for_book(cls, category, availability, delta):
+        """Count a book in (delta=1) or out of (delta=-1) its category"""
+        if availability:
+            cls.adjust(category, available=delta)
+        else:
+            cls.adjust(category, loaned=delta)
+
+    def __str__(self):
+        return f"{self.category}: {self.available} available, {self.loaned} loaned"
+
+
+class MemberCounter(models.Model):
+    """Maintained count of active loans per member"""
+    member = models.OneToOneField(
+        Member,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='loan_counter'
+    )
+    active_loans = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Member Counter'
+        verbose_name_plural = 'Member Counters'
+        indexes = [
+            models.Index(fields=['-active_loans'], name='api_member_counter_active_idx'),
+        ]
+
+    @classmethod
+    def adjust(cls, member_id, active_loans):
+        """Add `active_loans` to a member's counter, creating its row on first use"""
+        updated = cls.objects.filter(member_id=member_id).update(
+            active_loans=models.F('active_loans') + active_loans
+        )
+        if not updated:
+            try:
+                with transaction.atomic():
+                    cls.objects.create(member_id=member_id, active_loans=active_loans)
+            except IntegrityError:
+                cls.adjust(member_id, active_loans)
+
+    def __str__(self):
+        return f"{self.member_id}: {self.active_loans} active loans"
+
+
+class ArchiveSegment(models.Model):
+    """One archive file of loans or history rows moved out of the hot tables"""
+    KIND_CHOICES = [
+        ('loans', 'Loans'),
+        ('history', 'History'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # Relative to ARCHIVE_DIR
+    path = models.CharField(max_length=255, unique=True)
+    first_date = models.DateField()
+    last_date = models.DateField()
+    rows = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Archive Segment'
+        verbose_name_plural = 'Archive Segments'
+        ordering = ['kind', 'first_date']
+        indexes = [
+            models.Index(fields=['kind', 'first_date'], name='api_archive_kind_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.first_date} - {self.last_date} ({self.rows} rows)"
+
+
+class ArchivedMember(models.Model):
+    """
+    Index of the members appearing in an archive segment, so that a member's
+    archived rows are read from their segments only.
+
+    `member_id` is not a foreign key: archived rows outlive the member.
+    """
+    segment = models.ForeignKey(
+        ArchiveSegment,
+        on_delete=models.CASCADE,
+        related_name='members'
+    )
+    member_id = models.UUIDField()
+    rows = models.PositiveIntegerField()
+    first_date = models.DateField()
+    last_date = models.DateField()
+
+    class Meta:
+        verbose_name = 'Archived Member'
+        verbose_name_plural = 'Archived Members'
+        constraints = [
+            models.UniqueConstraint(fields=['member_id', 'segment'], name='api_archived_member_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.member_id} in {self.segment_id} ({self.rows} rows)"
+
+
+class OutboxEvent(models.Model):
+    """
+    A loan event waiting for its downstream handlers (see api/outbox.py).
+
+    Rows are written in the transaction that makes the change, so an event
+    exists exactly when the change committed, and deleted once every handler
+    for the topic has run.
+    """
+    topic = models.CharField(max_length=50)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Not handed to the worker before this time; pushed back while a worker
+    # holds the event and after a failure. NULL once the event has failed
+    # OUTBOX_MAX_ATTEMPTS times, which keeps dead letters out of the index.
+    available_at = models.DateTimeField(default=timezone.now, null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name = 'Outbox Event'
+        verbose_name_plural = 'Outbox Events'
+        ordering = ['id']
+        indexes = [
+            models.Index(
+                fields=['available_at', 'id'],
+                name='api_outbox_available_idx',
+                condition=models.Q(available_at__isnull=False)
+            ),
+        ]
+
+    @classmethod
+    def for_loan(cls, loan):
+        """An unsaved loan.checked_out or loan.returned event for `loan`"""
+        returned = loan.status == 'RETURNED'
+        return cls(
+            topic='loan.returned' if returned else 'loan.checked_out',
+            payload={
+                'loan': str(loan.id),
+                'book': str(loan.book_id),
+                'member': str(loan.member_id),
+                'date': str(loan.return_date if returned else loan.loan_date),
+                'due_date': str(loan.due_date),
+            }
+        )
+
+    def __str__(self):
+        return f"{self.topic} #{self.pk} ({self.attempts} attempts)"
+
+
+class Job(models.Model):
+    """
+    A piece of background work (see api/jobs.py), run by `manage.py
+    run_job_worker` outside the request that queued it.
+    """
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('SUCCEEDED', 'Succeeded'),
+        ('FAILED', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(default=dict, blank=True)
+    # Higher runs first; equal priorities run in the order they were queued
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='QUEUED'
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    progress = models.JSONField(default=dict, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='jobs'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Not started before this time; pushed back after a failed attempt
+    available_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Refreshed on every progress report; a running job that stops reporting
+    # for JOB_TIMEOUT seconds is taken to have lost its worker
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Job'
+        verbose_name_plural = 'Jobs'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', '-priority', 'available_at'], name='api_job_queue_idx'),
+        ]
+
+    def report(self, progress):
+        """Record `progress` (a JSON-able dict) and that the job is still alive"""
+        self.progress = dict(progress)
+        self.heartbeat_at = timezone.now()
+        Job.objects.filter(pk=self.pk).update(progress=self.progress, heartbeat_at=self.heartbeat_at)
+
+    def __str__(self):
+        return f"{self.kind} {self.id} ({self.get_status_display()})"
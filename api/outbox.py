@@ -0,0 +1,118 @@
+"""
+Transactional outbox for loan events.
+
+Checkouts and returns write an OutboxEvent row in their own transaction
+(topics `loan.checked_out` and `loan.returned`). `manage.py
+run_outbox_worker` hands the rows to the handlers registered for their
+topic, outside the request, and deletes each row once its handlers succeed.
+
+Delivery is at least once: a batch that is interrupted is handed out
+again once its claim times out, so handlers must tolerate seeing an event
+twice. Handlers register
+with the `handler` decorator from an `outbox_handlers` module in any
+installed app; those modules are imported when the worker starts.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+# Handlers for every topic are registered under this name
+ALL_TOPICS = '*'
+
+_handlers = defaultdict(list)
+
+
+def handler(*topics):
+    """
+    Register the decorated function for `topics` (all topics if none).
+    It is called with the event's topic and payload.
+    """
+    def register(func):
+        for topic in topics or (ALL_TOPICS,):
+            if func not in _handlers[topic]:
+                _handlers[topic].append(func)
+        return func
+    return register
+
+
+def unregister(func):
+    for handlers in _handlers.values():
+        if func in handlers:
+            handlers.remove(func)
+
+
+def handlers_for(topic):
+    return _handlers[topic] + _handlers[ALL_TOPICS]
+
+
+def autodiscover():
+    """Import the outbox_handlers module of every installed app"""
+    autodiscover_modules('outbox_handlers')
+
+
+def retry_delay(attempts):
+    """Exponential backoff after a failed attempt, capped at an hour"""
+    return timedelta(seconds=min(2 ** attempts, 3600))
+
+
+def drain(batch_size=None):
+    """
+    Handle one batch of due events, oldest first; returns how many were
+    taken.
+
+    The batch is claimed in a short transaction of its own, and the
+    handlers run after it commits, so no row lock is held while they work.
+    Claiming pushes the events' available_at OUTBOX_CLAIM_TIMEOUT seconds
+    ahead, which keeps other workers off them; if this worker dies
+    mid-batch, they are handed out again after that.
+    """
+    events = claim(batch_size or settings.OUTBOX_BATCH_SIZE)
+    handled = []
+    for event in events:
+        try:
+            # A failing handler only rolls back its own event's work
+            with transaction.atomic():
+                for func in handlers_for(event.topic):
+                    func(event.topic, event.payload)
+        except Exception as exc:
+            record_failure(event, exc)
+        else:
+            handled.append(event.pk)
+    OutboxEvent.objects.filter(pk__in=handled).delete()
+    return len(events)
+
+
+def claim(batch_size):
+    """Lease the next `batch_size` due events to this worker; rows locked by another one are skipped"""
+    now = timezone.now()
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.select_for_update(skip_locked=True).filter(
+                available_at__lte=now,
+                attempts__lt=settings.OUTBOX_MAX_ATTEMPTS
+            ).order_by('id')[:batch_size]
+        )
+        OutboxEvent.objects.filter(pk__in=[event.pk for event in events]).update(
+            available_at=now + timedelta(seconds=settings.OUTBOX_CLAIM_TIMEOUT)
+        )
+    return events
+
+
+def record_failure(event, exc):
+    """Schedule a retry of a failed event, or park it as a dead letter after OUTBOX_MAX_ATTEMPTS"""
+    event.attempts += 1
+    event.last_error = f'{type(exc).__name__}: {exc}'
+    if event.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+        event.available_at = None
+        logger.error('Outbox event %s (%s) failed %s times, giving up', event.pk, event.topic, event.attempts)
+    else:
+        event.available_at = timezone.now() + retry_delay(event.attempts)
+        logger.warning('Outbox event %s (%s) failed, attempt %s', event.pk, event.topic, event.attempts)
+    event.save(update_fields=['attempts', 'last_error', 'available_at'])
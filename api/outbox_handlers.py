@@ -0,0 +1,48 @@
+"""
+Outbox handlers of the api app, imported by `manage.py run_outbox_worker`.
+
+With MEMBER_LOAN_NOTICES on, members get an email for each of their
+checkouts, returns and newly overdue loans. Mail goes through the
+EMAIL_BACKEND setting.
+"""
+import logging
+from django.conf import settings
+from django.core.mail import send_mail
+from accounts.models import Member
+from .models import Book
+from .outbox import handler
+
+logger = logging.getLogger(__name__)
+
+NOTICES = {
+    'loan.checked_out': (
+        'You borrowed "{title}"',
+        'Hello {name},\n\nYou borrowed "{title}" on {date}. Please return it by {due_date}.\n'
+    ),
+    'loan.returned': (
+        'You returned "{title}"',
+        'Hello {name},\n\nWe received "{title}" back on {date}. Thank you.\n'
+    ),
+    'loan.overdue': (
+        '"{title}" is overdue',
+        'Hello {name},\n\n"{title}" was due on {due_date} and is {days_overdue} days overdue. '
+        'Please return it as soon as you can.\n'
+    ),
+}
+
+
+@handler(*NOTICES)
+def notify_member(topic, payload):
+    """Email the member of a loan event, if MEMBER_LOAN_NOTICES is on"""
+    if not settings.MEMBER_LOAN_NOTICES:
+        return
+    member = Member.objects.filter(pk=payload['member']).only('name', 'email').first()
+    book = Book.objects.filter(pk=payload['book']).only('title').first()
+    if member is None or book is None:
+        # Deleted since the event was written; there is nobody to tell
+        logger.info('Skipping %s notice for loan %s: member or book is gone', topic, payload['loan'])
+        return
+
+    subject, body = NOTICES[topic]
+    values = {**payload, 'name': member.name, 'title': book.title}
+    send_mail(subject.format(**values), body.format(**values), None, [member.email])
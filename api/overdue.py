@@ -0,0 +1,84 @@
+"""
+Overdue loans: loans still out after their due date.
+
+Both the /api/loans/overdue/ listing and the nightly sweep read the partial
+index on (status, due_date, id) over LOANED loans, so their cost follows the number
+of loans out, not the size of the loan table.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import Loan, OutboxEvent
+
+
+def overdue_filter(today=None):
+    """Matches loans still out whose due date is before `today`"""
+    return Q(status='LOANED', due_date__lt=today or timezone.localdate())
+
+
+def overdue_loans(today=None):
+    return Loan.objects.filter(overdue_filter(today))
+
+
+class OverdueSweeper:
+    """
+    Mark newly overdue loans `batch_size` at a time, oldest due date first.
+
+    Each batch commits on its own with a `loan.overdue` outbox event per
+    loan, so handlers (notices, fines) pick them up; loans already marked
+    are left alone, and a run can stop at any point.
+    """
+    def __init__(self, batch_size=None, progress=None):
+        self.batch_size = batch_size or settings.OVERDUE_SWEEP_BATCH_SIZE
+        self.progress = progress
+        self.summary = {'batches': 0, 'marked': 0}
+
+    def run(self, today=None):
+        """Mark every loan overdue as of `today`; returns the summary"""
+        today = today or timezone.localdate()
+        after = None
+        while True:
+            batch = self.mark_batch(today, after)
+            if not batch:
+                break
+            after = batch[-1]
+            self.summary['batches'] += 1
+            self.summary['marked'] += len(batch)
+            if self.progress:
+                self.progress(self.summary)
+        self.summary['overdue'] = overdue_loans(today).count()
+        return self.summary
+
+    def mark_batch(self, today, after):
+        """Mark the next batch after the (due_date, id) position `after`; returns its positions"""
+        candidates = overdue_loans(today).filter(marked_overdue_at__isnull=True)
+        if after is not None:
+            # Walk the index forward instead of rescanning the loans already done
+            due_date, key = after
+            candidates = candidates.filter(Q(due_date__gt=due_date) | Q(due_date=due_date, id__gt=key))
+
+        now = timezone.now()
+        with transaction.atomic():
+            rows = list(
+                candidates.select_for_update(skip_locked=True).order_by('due_date', 'id').values_list(
+                    'id', 'book_id', 'member_id', 'due_date'
+                )[:self.batch_size]
+            )
+            if not rows:
+                return []
+            Loan.objects.filter(pk__in=[row[0] for row in rows]).update(marked_overdue_at=now)
+            OutboxEvent.objects.bulk_create([
+                OutboxEvent(
+                    topic='loan.overdue',
+                    payload={
+                        'loan': str(loan_id),
+                        'book': str(book_id),
+                        'member': str(member_id),
+                        'due_date': str(due_date),
+                        'days_overdue': (today - due_date).days,
+                    }
+                )
+                for loan_id, book_id, member_id, due_date in rows
+            ])
+        return [(due_date, loan_id) for loan_id, _, _, due_date in rows]
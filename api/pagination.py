@@ -0,0 +1,302 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, InvalidPage, Page, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def estimate_row_count(model, using='default'):
+    """Return the planner's row estimate for a model's table, or None if unknown"""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # Summed over the leaf partitions when the table is partitioned.
+            # For a plain table pg_partition_tree returns the table itself as
+            # its only, leaf, row, so both conditions match that one pg_class
+            # row and it is counted once. reltuples is -1 for tables never
+            # analyzed
+            cursor.execute(
+                'SELECT CASE WHEN MAX(reltuples) < 0 THEN -1 ELSE SUM(GREATEST(reltuples, 0)) END::bigint '
+                "FROM pg_class WHERE (oid = %s::regclass AND relkind = 'r') "
+                'OR oid IN (SELECT relid FROM pg_partition_tree(%s::regclass) WHERE isleaf)',
+                [table, table]
+            )
+        elif connection.vendor == 'sqlite':
+            # rowids only grow, so the largest one bounds the row count from above
+            cursor.execute(f'SELECT MAX(rowid) FROM {connection.ops.quote_name(table)}')
+        else:
+            return None
+        row = cursor.fetchone()
+    if not row or row[0] is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+class EstimatedCountPage(Page):
+    """Page that works out has_next from the rows fetched when the count is inexact"""
+    has_more = False
+
+    def has_next(self):
+        if self.paginator.count_exact:
+            return super().has_next()
+        return self.has_more
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator whose count never scans more than `count_cap` rows.
+
+    Results up to the cap are counted exactly. Above it, unfiltered querysets
+    report the table estimate and filtered ones report the cap as a lower
+    bound; `count_exact` is False in both cases and pages are then navigated
+    by fetching one extra row instead of by comparing against the count.
+    """
+    @property
+    def count_cap(self):
+        return settings.PAGINATION_COUNT_CAP
+
+    @cached_property
+    def counted(self):
+        """(count, count_exact) for the object list"""
+        if isinstance(self.object_list, list):
+            # Already in memory, such as history merged with its archive
+            return len(self.object_list), True
+        capped = self.object_list.order_by()[:self.count_cap + 1].count()
+        estimate = None
+        if capped > self.count_cap and not self.object_list.query.where:
+            estimate = estimate_row_count(self.object_list.model, self.object_list.db)
+        return self.resolve_count(capped, estimate)
+
+    async def acounted(self):
+        """Async counterpart of `counted`; fills it in so the sync accessors run no query"""
+        if 'counted' not in self.__dict__:
+            capped = await self.object_list.order_by()[:self.count_cap + 1].acount()
+            estimate = None
+            if capped > self.count_cap and not self.object_list.query.where:
+                estimate = await sync_to_async(estimate_row_count)(self.object_list.model, self.object_list.db)
+            self.__dict__['counted'] = self.resolve_count(capped, estimate)
+        return self.counted
+
+    def resolve_count(self, capped, estimate):
+        if capped <= self.count_cap:
+            return capped, True
+        if estimate is not None and estimate > self.count_cap:
+            return estimate, False
+        return self.count_cap, False
+
+    @property
+    def count(self):
+        return self.counted[0]
+
+    @property
+    def count_exact(self):
+        return self.counted[1]
+
+    def validate_number(self, number):
+        if self.count_exact:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            return super().validate_number(number)
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if self.count_exact:
+            return super().page(number)
+        return self.page_from_rows(list(self.object_list[self.page_slice(number)]), number)
+
+    async def apage(self, number):
+        """Async counterpart of page(), fetching the rows with the async ORM"""
+        await self.acounted()
+        number = self.validate_number(number)
+        rows = [row async for row in self.object_list[self.page_slice(number)]]
+        if self.count_exact:
+            return self._get_page(rows, number, self)
+        return self.page_from_rows(rows, number)
+
+    def page_slice(self, number):
+        """Rows to fetch for page `number`: the page itself, plus one when the count is inexact"""
+        bottom = (number - 1) * self.per_page
+        if not self.count_exact:
+            return slice(bottom, bottom + self.per_page + 1)
+        top = bottom + self.per_page
+        if top + self.orphans >= self.count:
+            top = self.count
+        return slice(bottom, top)
+
+    def page_from_rows(self, rows, number):
+        if not rows and number > 1:
+            raise EmptyPage(self.error_messages['no_results'])
+        page = self._get_page(rows[:self.per_page], number, self)
+        page.has_more = len(rows) > self.per_page
+        return page
+
+    def _get_page(self, *args, **kwargs):
+        return EstimatedCountPage(*args, **kwargs)
+
+
+class EstimatedCountPagination(PageNumberPagination):
+    """
+    PageNumberPagination that skips the full COUNT(*) on large results.
+
+    Responses carry `count_exact` telling clients whether `count` is exact
+    or an estimate / lower bound (see EstimatedCountPaginator).
+    """
+    django_paginator_class = EstimatedCountPaginator
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Async counterpart of paginate_queryset, querying through the async ORM"""
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        await paginator.acounted()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = await paginator.apage(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return list(self.page)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data['count_exact'] = self.page.paginator.count_exact
+        return response
+
+
+class KeysetPagination(EstimatedCountPagination):
+    """
+    PageNumberPagination with an opt-in keyset (cursor) mode.
+
+    Requests that carry a `cursor` parameter (empty for the first page) are
+    paged newest first on `keyset`, a (date field, unique tiebreaker) pair,
+    instead of by page number. Each page is a single indexed range query with
+    no COUNT(*) or OFFSET, so deep pages cost the same as the first one.
+    Keyset pages ignore ?ordering= and return only `next` and `results`.
+    """
+    keyset = None
+    cursor_query_param = 'cursor'
+    cursor_page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_keyset = self.cursor_query_param in request.query_params
+        if not self.use_keyset:
+            return super().paginate_queryset(queryset, request, view)
+        return self.keyset_page(list(self.keyset_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.use_keyset = self.cursor_query_param in request.query_params
+        if not self.use_keyset:
+            return await super().apaginate_queryset(queryset, request, view)
+        return self.keyset_page([row async for row in self.keyset_queryset(queryset, request)])
+
+    def keyset_queryset(self, queryset, request):
+        """The rows after the request's cursor, limited to one more than the page size"""
+        self.request = request
+        self.cursor_page_size = self.get_cursor_page_size(request)
+        field, tiebreaker = self.keyset
+        if isinstance(queryset, list):
+            return self.keyset_list(queryset, request)
+
+        queryset = queryset.order_by(f'-{field}', f'-{tiebreaker}')
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            value, key = position
+            # The redundant `<=` bound gives the database an index range to start from
+            queryset = queryset.filter(
+                Q(**{f'{field}__lte': value}),
+                Q(**{f'{field}__lt': value}) | Q(**{field: value, f'{tiebreaker}__lt': key})
+            )
+
+        return queryset[:self.cursor_page_size + 1]
+
+    def keyset_list(self, rows, request):
+        """keyset_queryset for rows already in memory"""
+        if not rows:
+            return []
+        field, tiebreaker = self.keyset
+        key = lambda row: (getattr(row, field), getattr(row, tiebreaker))
+        rows = sorted(rows, key=key, reverse=True)
+        position = self.decode_cursor(request, type(rows[0]))
+        if position is not None:
+            rows = [row for row in rows if key(row) < position]
+        return rows[:self.cursor_page_size + 1]
+
+    def keyset_page(self, rows):
+        self.has_next = len(rows) > self.cursor_page_size
+        self.keyset_rows = rows[:self.cursor_page_size]
+        return self.keyset_rows
+
+    def get_paginated_response(self, data):
+        if not self.use_keyset:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_cursor_link(),
+            'results': data,
+        })
+
+    def get_cursor_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.cursor_page_size_query_param],
+                strict=True,
+                cutoff=settings.CURSOR_PAGINATION_MAX_PAGE_SIZE
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_next_cursor_link(self):
+        if not self.has_next:
+            return None
+        field, tiebreaker = self.keyset
+        last = self.keyset_rows[-1]
+        token = self.encode_cursor(getattr(last, field), getattr(last, tiebreaker))
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def encode_cursor(self, value, key):
+        payload = json.dumps([str(value), str(key)]).encode()
+        return urlsafe_b64encode(payload).decode().rstrip('=')
+
+    def decode_cursor(self, request, model):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            payload = urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            value, key = json.loads(payload)
+            return tuple(
+                model._meta.get_field(name).to_python(raw)
+                for name, raw in zip(self.keyset, (value, key))
+            )
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class LoanPagination(KeysetPagination):
+    """Pagination for loans, keyset mode keyed on (loan_date, id)"""
+    keyset = ('loan_date', 'id')
+
+
+class LoanHistoryPagination(KeysetPagination):
+    """Pagination for loan history, keyset mode keyed on (action_date, id)"""
+    keyset = ('action_date', 'id')
@@ -0,0 +1,159 @@
+"""
+Monthly partitions of the loan history table.
+
+On PostgreSQL `api_loanhistory` is range-partitioned by `action_date`, one
+partition per month (`api_loanhistory_2026_10`) plus a default partition
+that catches rows no monthly partition covers yet. Date range filters only
+scan the months they overlap, and old months can be detached as a whole
+instead of deleted row by row. Other databases keep a single table; there,
+detaching a month moves its rows into a standalone table of the same name,
+so the outcome of `partition_history` is the same on every backend.
+"""
+import re
+from datetime import date
+from django.db import connections, transaction
+from .models import LoanHistory
+
+TABLE = LoanHistory._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+PARTITION_NAME = re.compile(rf'^{TABLE}_(\d{{4}})_(\d{{2}})$')
+
+
+def add_months(month, count):
+    """The first day of the month `count` months after `month`"""
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_{month:%Y_%m}'
+
+
+def is_partitioned(using='default'):
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT relkind FROM pg_class WHERE oid = %s::regclass', [TABLE])
+        return cursor.fetchone()[0] == 'p'
+
+
+def attached_partitions(using='default'):
+    """{month: table name} of the monthly partitions currently attached"""
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = %s::regclass',
+            [TABLE]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = {}
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions[date(int(match[1]), int(match[2]), 1)] = name
+    return partitions
+
+
+def create_partitions(months_ahead, today, using='default'):
+    """
+    Create the partitions for this month, the next `months_ahead` months and
+    any month that has rows waiting in the default partition.
+
+    Returns [(table name, rows moved from the default partition)] for the
+    partitions created, which is empty where history is not partitioned.
+    """
+    if not is_partitioned(using):
+        return []
+
+    current = today.replace(day=1)
+    months = {add_months(current, offset) for offset in range(months_ahead + 1)}
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"SELECT DISTINCT date_trunc('month', action_date)::date FROM {DEFAULT_PARTITION}"
+        )
+        months.update(row[0] for row in cursor.fetchall())
+
+    existing = attached_partitions(using)
+    return [
+        (partition_name(month), create_partition(month, using))
+        for month in sorted(months - existing.keys())
+    ]
+
+
+def create_partition(month, using='default'):
+    """
+    Create and attach the partition for `month`; returns the rows moved into it.
+
+    Rows already in the default partition for that month are moved over
+    first, since PostgreSQL refuses to attach a range the default holds rows for.
+    """
+    name = partition_name(month)
+    start, end = month.isoformat(), add_months(month, 1).isoformat()
+    connection = connections[using]
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute(f'CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} '
+            f'WHERE action_date >= %s AND action_date < %s RETURNING *) '
+            f'INSERT INTO {name} SELECT * FROM moved',
+            [start, end]
+        )
+        moved = cursor.rowcount
+        cursor.execute(f"ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')")
+    return moved
+
+
+def detach_partitions(before, drop=False, using='default'):
+    """
+    Take every month that ends on or before `before` out of the history table.
+
+    Each month is left behind as a standalone `api_loanhistory_YYYY_MM`
+    table, or dropped with `drop`. Returns the table names, oldest first.
+    """
+    partitioned = is_partitioned(using)
+    if partitioned:
+        months = attached_partitions(using)
+    else:
+        months = {
+            month: partition_name(month)
+            for month in LoanHistory.objects.using(using).filter(
+                action_date__lt=before
+            ).dates('action_date', 'month')
+        }
+
+    detached = []
+    for month, name in sorted(months.items()):
+        if add_months(month, 1) > before:
+            continue
+        with transaction.atomic(using=using):
+            if partitioned:
+                detach_partition(name, drop, using)
+            else:
+                move_month(month, name, drop, using)
+        detached.append(name)
+    return detached
+
+
+def detach_partition(name, drop, using):
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+        if drop:
+            cursor.execute(f'DROP TABLE {name}')
+
+
+def move_month(month, name, drop, using):
+    """Fallback for unpartitioned databases: move one month of rows into table `name`"""
+    rows = LoanHistory.objects.using(using).filter(
+        action_date__gte=month,
+        action_date__lt=add_months(month, 1)
+    )
+    if not drop:
+        connection = connections[using]
+        sql, params = rows.values(*[field.column for field in LoanHistory._meta.concrete_fields]).query.sql_with_params()
+        with connection.cursor() as cursor:
+            if name in connection.introspection.table_names(cursor):
+                cursor.execute(f'INSERT INTO {name} {sql}', params)
+            else:
+                cursor.execute(f'CREATE TABLE {name} AS {sql}', params)
+    rows.delete()
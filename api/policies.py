@@ -0,0 +1,21 @@
+"""
+Loan due-date policies.
+
+settings.LOAN_DUE_DATE_POLICY names the policy class; it is asked for the
+due date of every new loan. Another policy (per category, per member,
+skipping closing days) only has to implement due_date(loan).
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+def get_due_date_policy():
+    """An instance of settings.LOAN_DUE_DATE_POLICY"""
+    return import_string(settings.LOAN_DUE_DATE_POLICY)()
+
+
+class FixedPeriodPolicy:
+    """Every loan is due LOAN_PERIOD_DAYS after it was made"""
+    def due_date(self, loan):
+        return loan.loan_date + timedelta(days=settings.LOAN_PERIOD_DAYS)
@@ -0,0 +1,22 @@
+"""
+Renderers shared by the API's streamed formats.
+"""
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+
+class StreamedRenderer(BaseRenderer):
+    """
+    Base for formats whose bodies the view streams itself (exports, live
+    events). The renderer lets content negotiation (?format=, a suffix or
+    Accept) pick the format; only error payloads ever reach render(), and
+    those are sent as JSON.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = 'application/json'
+        return json.dumps(data, cls=DjangoJSONEncoder).encode()
@@ -0,0 +1,121 @@
+from functools import lru_cache
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from rest_framework import filters
+
+# Models with a full-text index, keyed by label, mapped to their indexed columns.
+# The indexes themselves are created by the 0005 migrations of the api and
+# accounts apps.
+SEARCH_INDEXES = {
+    'api.book': ('title', 'category'),
+    'accounts.member': ('name', 'email', 'cpf'),
+}
+
+
+def has_trigram_extension(alias):
+    """Whether pg_trgm is installed in the `alias` database"""
+    with connections[alias].cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+@lru_cache
+def trigram_search_available(alias):
+    """has_trigram_extension, checked once per process"""
+    return has_trigram_extension(alias)
+
+
+class SearchBackend:
+    """
+    Plain `icontains` matching, used when no index is available.
+
+    Every term has to match at least one of `fields`, like DRF's SearchFilter.
+    """
+    def search(self, queryset, fields, terms):
+        for term in terms:
+            condition = Q()
+            for field in fields:
+                condition |= Q(**{f'{field}__icontains': term})
+            queryset = queryset.filter(condition)
+        return queryset
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """
+    Search through the FTS5 trigram shadow tables kept in sync by triggers.
+
+    The trigram tokenizer matches substrings, so results are the same as the
+    `icontains` scan for every term of three or more characters. Shorter
+    terms cannot be looked up in a trigram index and fall back to the scan.
+    """
+    MIN_TERM_LENGTH = 3
+
+    def search(self, queryset, fields, terms):
+        model = queryset.model
+        if any(len(term) < self.MIN_TERM_LENGTH for term in terms):
+            return super().search(queryset, fields, terms)
+
+        table = model._meta.db_table
+        match = ' AND '.join('"{}"'.format(term.replace('"', '""')) for term in terms)
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT id FROM {table}_fts WHERE {table}_fts MATCH %s',
+            [match]
+        ))
+
+
+class PostgresSearchBackend(SearchBackend):
+    """
+    `icontains` served by pg_trgm GIN indexes, ranked by trigram similarity.
+
+    Results are annotated with `search_rank` so the filter can order the best
+    matches first when the client did not ask for another ordering.
+    """
+    def search(self, queryset, fields, terms):
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        queryset = super().search(queryset, fields, terms)
+        phrase = ' '.join(terms)
+        rank = TrigramWordSimilarity(phrase, fields[0])
+        for field in fields[1:]:
+            rank = rank + TrigramWordSimilarity(phrase, field)
+        return queryset.annotate(search_rank=rank)
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_search_backend():
+    """Return the backend named by settings.SEARCH_BACKEND or matching the database"""
+    path = getattr(settings, 'SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == 'postgresql' and not trigram_search_available(connection.alias):
+        # The search index migrations skipped the trigram indexes
+        return SearchBackend()
+    return BACKENDS.get(connection.vendor, SearchBackend)()
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter that uses the full-text index for models in SEARCH_INDEXES.
+
+    Views searching related fields or unindexed models keep the default
+    SearchFilter behaviour.
+    """
+    def filter_queryset(self, request, queryset, view):
+        search_fields = self.get_search_fields(view, request)
+        terms = self.get_search_terms(request)
+        indexed = SEARCH_INDEXES.get(queryset.model._meta.label_lower, ())
+        if not search_fields or not terms or not set(search_fields) <= set(indexed):
+            return super().filter_queryset(request, queryset, view)
+
+        queryset = get_search_backend().search(queryset, list(search_fields), terms)
+        if 'search_rank' in queryset.query.annotations and not request.query_params.get('ordering'):
+            queryset = queryset.order_by('-search_rank', *queryset.query.order_by)
+        return queryset
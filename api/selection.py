@@ -0,0 +1,174 @@
+"""
+Sparse fieldsets for list and retrieve: ?fields= and ?expand=.
+
+`fields` names the fields to return, comma separated; a nested object's
+fields can be picked with a dot, as `book_details.title`. `expand` names
+the nested objects to embed, so an empty `expand=` returns flat ids only.
+Without either parameter responses are unchanged.
+
+The view loads only what the response needs: select_related follows the
+nested objects that are kept, and only() limits the columns to the kept
+fields plus those the ETag, ordering and keyset pagination read.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import filters, serializers
+from .async_views import read_actions
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def split_names(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+class FieldSelection:
+    """
+    The fields a request asked for.
+
+    `fields` maps each top-level field to the set of its nested fields
+    wanted, None meaning all of them, or is None for every field; `expand`
+    is the set of nested objects to embed, or None for all of them.
+    """
+    def __init__(self, fields=None, expand=None):
+        self.fields = fields
+        self.expand = expand
+
+    @classmethod
+    def from_request(cls, request):
+        """The selection in the request's query parameters, or None if it makes none"""
+        params = request.query_params
+        if FIELDS_PARAM not in params and EXPAND_PARAM not in params:
+            return None
+
+        fields = None
+        if FIELDS_PARAM in params:
+            fields = {}
+            for name in split_names(params[FIELDS_PARAM]):
+                name, _, nested = name.partition('.')
+                if not nested:
+                    fields[name] = None
+                elif fields.get(name, set()) is not None:
+                    fields.setdefault(name, set()).add(nested)
+
+        expand = set(split_names(params[EXPAND_PARAM])) if EXPAND_PARAM in params else None
+        return cls(fields, expand)
+
+    def prune(self, serializer):
+        """Drop the fields that were not asked for from `serializer`, in place"""
+        for name, field in list(serializer.fields.items()):
+            nested = isinstance(field, serializers.BaseSerializer)
+            if self.fields is not None and name not in self.fields:
+                del serializer.fields[name]
+            elif nested and self.expand is not None and name not in self.expand:
+                del serializer.fields[name]
+            elif nested and self.fields and self.fields[name] is not None:
+                child = getattr(field, 'child', field)
+                for nested_name in list(child.fields):
+                    if nested_name not in self.fields[name]:
+                        del child.fields[nested_name]
+        return serializer
+
+    def restrict(self, queryset, serializer, keep=()):
+        """
+        `queryset` with select_related and only() for the fields `serializer`
+        kept, plus the `keep` lookups. Falls back to select_related alone when
+        a field is not backed by a column, such as a SerializerMethodField.
+        """
+        relations = nested_relations(serializer)
+        columns = {queryset.model._meta.pk.name}
+        restrictable = True
+        for field in serializer.fields.values():
+            sources = [field.source]
+            if isinstance(field, serializers.BaseSerializer):
+                related_model = queryset.model._meta.get_field(field.source).related_model
+                nested_fields = getattr(field, 'child', field).fields.values()
+                sources += [f'{field.source}__{related_model._meta.pk.name}']
+                sources += [f'{field.source}__{nested.source}' for nested in nested_fields]
+            for source in sources:
+                if is_column(queryset.model, source):
+                    columns.add(source)
+                else:
+                    restrictable = False
+
+        for lookup in keep:
+            relation = lookup.split('__')[0]
+            if '__' not in lookup or relation in relations:
+                columns.add(lookup)
+
+        # select_related() with no names would follow every foreign key
+        queryset = queryset.select_related(None)
+        if relations:
+            queryset = queryset.select_related(*relations)
+        return queryset.only(*columns) if restrictable else queryset
+
+
+def nested_relations(serializer):
+    """The relations behind the nested serializers `serializer` kept"""
+    return [
+        field.source for field in serializer.fields.values()
+        if isinstance(field, serializers.BaseSerializer)
+    ]
+
+
+def is_column(model, lookup):
+    """Whether `lookup` (a field name, or relation__field) names a column only() can load"""
+    *relations, name = lookup.split('__')
+    try:
+        for relation in relations:
+            model = model._meta.get_field(relation).related_model
+        field = model._meta.get_field(name)
+    except (FieldDoesNotExist, AttributeError):
+        return False
+    return field.concrete and not field.many_to_many
+
+
+class FieldSelectionMixin:
+    """
+    ?fields= / ?expand= support for a viewset's list and retrieve.
+
+    get_queryset should pass its queryset, with its default select_related,
+    through select_fields(); serializers from get_serializer() are pruned to
+    the selection.
+    """
+    def get_field_selection(self):
+        if self.action not in read_actions(self):
+            return None
+        if not hasattr(self, '_field_selection'):
+            self._field_selection = FieldSelection.from_request(self.request)
+        return self._field_selection
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        selection = self.get_field_selection()
+        if selection is not None:
+            selection.prune(getattr(serializer, 'child', serializer))
+        return serializer
+
+    def get_selected_serializer(self):
+        """An unbound serializer pruned to the selection, describing the response rows"""
+        if not hasattr(self, '_selected_serializer'):
+            serializer = self.get_serializer_class()(context=self.get_serializer_context())
+            self._selected_serializer = self.get_field_selection().prune(serializer)
+        return self._selected_serializer
+
+    def select_fields(self, queryset):
+        """Limit `queryset` to the relations and columns the selected fields need"""
+        if self.get_field_selection() is None:
+            return queryset
+
+        # Rows merged in memory (see LoanHistoryViewSet) are sorted on the ordering fields
+        keep = list(getattr(self, 'etag_fields', ()))
+        if filters.OrderingFilter in self.filter_backends:
+            ordering = filters.OrderingFilter().get_ordering(self.request, queryset, self) or ()
+            keep += [field.lstrip('-') for field in ordering]
+        keep += getattr(self.pagination_class, 'keyset', None) or ()
+        return self.get_field_selection().restrict(queryset, self.get_selected_serializer(), keep)
+
+    def get_etag_fields(self):
+        """The ETag fields, less those on relations the selection leaves out"""
+        fields = super().get_etag_fields()
+        if self.get_field_selection() is None:
+            return fields
+        relations = nested_relations(self.get_selected_serializer())
+        return tuple(field for field in fields if '__' not in field or field.split('__')[0] in relations)
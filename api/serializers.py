@@ -1,8 +1,11 @@
 from rest_framework import serializers
 from django.utils import timezone
-from .models import Book, Loan, LoanHistory
+from .models import Book, Job, Loan, LoanHistory
 from accounts.serializers import MemberSerializer
 
+# Largest cart accepted by the bulk checkout/return endpoints
+BULK_MAX_ITEMS = 100
+
 
 class BookSerializer(serializers.ModelSerializer):
     """Serializer for Book model"""
@@ -15,7 +18,8 @@ class BookSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         """Convert UUIDs to strings for JSON serialization"""
         data = super().to_representation(instance)
-        data['id'] = str(instance.id)
+        if 'id' in data:
+            data['id'] = str(data['id'])
         return data
 
     def validate_title(self, value):
@@ -38,17 +42,20 @@ class LoanSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Loan
-        fields = ('id', 'book', 'member', 'loan_date', 'return_date', 
+        fields = ('id', 'book', 'member', 'loan_date', 'due_date', 'return_date',
                  'status', 'book_details', 'member_details', 
                  'created_at', 'updated_at')
-        read_only_fields = ('id', 'loan_date', 'created_at', 'updated_at')
+        # Loans are returned only through the return_book action, which
+        # releases the book and updates the counters, history and outbox
+        read_only_fields = ('id', 'loan_date', 'due_date', 'status', 'created_at', 'updated_at')
 
     def to_representation(self, instance):
         """Convert UUIDs to strings for JSON serialization"""
         data = super().to_representation(instance)
-        data['id'] = str(instance.id)
-        data['book'] = str(instance.book.id)
-        data['member'] = str(instance.member.id)
+        # Fields left out by ?fields= stay out
+        for name in ('id', 'book', 'member'):
+            if name in data:
+                data[name] = str(data[name])
         return data
 
     def validate(self, data):
@@ -57,22 +64,27 @@ class LoanSerializer(serializers.ModelSerializer):
             book = data.get('book')
             member = data.get('member')
             
-            # Check if member has active loans for this book first
-            existing_loan = Loan.objects.filter(
-                book=book,
-                member=member,
-                status='LOANED'
-            ).exists()
-            if existing_loan:
-                raise serializers.ValidationError({
-                    'non_field_errors': ['Member already has an active loan for this book.']
-                })
-            
-            # Then check book availability
+            # An active loan for this member implies the book is unavailable,
+            # so the extra lookup is only needed to pick the error message
             if not book.availability:
+                existing_loan = Loan.objects.filter(
+                    book=book,
+                    member=member,
+                    status='LOANED'
+                ).exists()
+                if existing_loan:
+                    raise serializers.ValidationError({
+                        'non_field_errors': ['Member already has an active loan for this book.']
+                    })
+
                 raise serializers.ValidationError({
                     'book': 'This book is not available for loan.'
                 })
+        else:
+            # Moving a loan to another book or member would bypass the checkout
+            for name in ('book', 'member'):
+                if name in data and data[name] != getattr(self.instance, name):
+                    raise serializers.ValidationError({name: 'The book and member of a loan cannot be changed.'})
 
         return data
 
@@ -108,7 +120,47 @@ class LoanHistorySerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         """Convert UUIDs to strings for JSON serialization"""
         data = super().to_representation(instance)
-        data['id'] = str(instance.id)
-        data['book'] = str(instance.book.id)
-        data['member'] = str(instance.member.id)
+        # Fields left out by ?fields= stay out
+        for name in ('id', 'book', 'member'):
+            if name in data:
+                data[name] = str(data[name])
+        return data
+
+
+class BulkCheckoutItemSerializer(serializers.Serializer):
+    """Serializer for one book/member pair in a bulk checkout"""
+    book = serializers.UUIDField()
+    member = serializers.UUIDField()
+
+
+class BulkCheckoutSerializer(serializers.Serializer):
+    """Serializer for a bulk checkout cart"""
+    loans = BulkCheckoutItemSerializer(many=True, allow_empty=False, max_length=BULK_MAX_ITEMS)
+
+
+class BulkReturnSerializer(serializers.Serializer):
+    """Serializer for a bulk return cart"""
+    loans = serializers.ListField(
+        child=serializers.UUIDField(),
+        allow_empty=False,
+        max_length=BULK_MAX_ITEMS
+    )
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """Serializer for Job model; clients set kind, params and priority only"""
+    created_by = serializers.StringRelatedField()
+
+    class Meta:
+        model = Job
+        fields = ('id', 'kind', 'params', 'priority', 'status', 'attempts', 'max_attempts',
+                  'progress', 'result', 'error', 'created_by', 'created_at', 'started_at', 'finished_at')
+        read_only_fields = ('id', 'status', 'attempts', 'max_attempts', 'progress', 'result',
+                            'error', 'created_at', 'started_at', 'finished_at')
+        extra_kwargs = {'priority': {'min_value': -100, 'max_value': 100}}
+
+    def to_representation(self, instance):
+        """Convert UUIDs to strings for JSON serialization"""
+        data = super().to_representation(instance)
+        data['id'] = str(data['id'])
         return data
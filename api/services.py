@@ -0,0 +1,155 @@
+from collections import Counter
+from django.db import transaction
+from django.utils import timezone
+from accounts.models import Member
+from .cache import invalidate_catalog
+from .events import loan_events, publish_on_commit
+from .models import Book, CategoryCounter, Loan, LoanHistory, MemberCounter, OutboxEvent
+from .policies import get_due_date_policy
+
+
+def adjust_counters(loans, direction):
+    """Apply one counter update per touched category and member"""
+    categories = Counter(loan.book.category for loan in loans)
+    members = Counter(loan.member_id for loan in loans)
+    # In key order, like every other lock taken here (see lock_in_order)
+    for category, count in sorted(categories.items()):
+        CategoryCounter.adjust(category, available=-direction * count, loaned=direction * count)
+    for member_id, count in sorted(members.items()):
+        MemberCounter.adjust(member_id, direction * count)
+
+
+def lock_in_order(queryset, pks):
+    """
+    Lock the rows of `queryset` with the given primary keys and return them
+    by pk.
+
+    Rows are locked in primary key order, so two carts that share rows take
+    their locks in the same order and cannot deadlock each other.
+    """
+    rows = queryset.select_for_update(of=('self',)).filter(pk__in=pks).order_by('pk')
+    return {row.pk: row for row in rows}
+
+
+def bulk_checkout(items):
+    """
+    Lend a cart of books in one transaction.
+
+    `items` is a list of {'book': uuid, 'member': uuid} dicts. Items that
+    cannot be lent are reported individually instead of failing the cart.
+    Returns one result dict per item, in input order.
+    """
+    today = timezone.now().date()
+    policy = get_due_date_policy()
+    results = []
+    loans = []
+
+    with transaction.atomic():
+        books = lock_in_order(Book.objects.all(), {item['book'] for item in items})
+        members = Member.objects.in_bulk({item['member'] for item in items})
+
+        claimed = set()
+        for item in items:
+            result = {'book': str(item['book']), 'member': str(item['member'])}
+            book = books.get(item['book'])
+            member = members.get(item['member'])
+
+            if book is None:
+                result['error'] = 'Book not found.'
+            elif member is None:
+                result['error'] = 'Member not found.'
+            elif not book.availability or book.pk in claimed:
+                result['error'] = 'This book is not available for loan.'
+            else:
+                claimed.add(book.pk)
+                loan = Loan(book=book, member=member, loan_date=today)
+                loan.due_date = policy.due_date(loan)
+                loans.append(loan)
+                result['loan'] = str(loan.id)
+            results.append(result)
+
+        if loans:
+            updated = Book.objects.filter(pk__in=claimed, availability=True).update(
+                availability=False,
+                updated_at=timezone.now()
+            )
+            if updated != len(claimed):
+                # Only reachable on backends without row locks
+                raise ValueError('Some books were lent by another request, please retry.')
+
+            Loan.objects.bulk_create(loans)
+            LoanHistory.objects.bulk_create([
+                LoanHistory(
+                    book_id=loan.book_id,
+                    member_id=loan.member_id,
+                    action_type='LOANED',
+                    action_date=today
+                )
+                for loan in loans
+            ])
+            OutboxEvent.objects.bulk_create([OutboxEvent.for_loan(loan) for loan in loans])
+            adjust_counters(loans, 1)
+            invalidate_catalog()
+            publish_on_commit([event for loan in loans for event in loan_events(loan)])
+
+    return results
+
+
+def bulk_return(loan_ids):
+    """
+    Return a cart of loans in one transaction.
+
+    Loans that are unknown or already returned are reported individually.
+    Returns one result dict per id, in input order.
+    """
+    today = timezone.now().date()
+    results = []
+    returning = {}
+
+    with transaction.atomic():
+        loans = lock_in_order(Loan.objects.select_related('book'), set(loan_ids))
+
+        for loan_id in loan_ids:
+            result = {'loan': str(loan_id)}
+            loan = loans.get(loan_id)
+
+            if loan is None:
+                result['error'] = 'Loan not found.'
+            elif loan.status == 'RETURNED' or loan.pk in returning:
+                result['error'] = 'This loan has already been returned.'
+            else:
+                returning[loan.pk] = loan
+                result['status'] = 'RETURNED'
+            results.append(result)
+
+        if returning:
+            now = timezone.now()
+            book_ids = [loan.book_id for loan in returning.values()]
+            lock_in_order(Book.objects.only('pk'), book_ids)
+            updated = Loan.objects.filter(pk__in=returning, status='LOANED').update(
+                status='RETURNED',
+                return_date=today,
+                updated_at=now
+            )
+            if updated != len(returning):
+                raise ValueError('Some loans were returned by another request, please retry.')
+
+            Book.objects.filter(pk__in=book_ids).update(availability=True, updated_at=now)
+            LoanHistory.objects.bulk_create([
+                LoanHistory(
+                    book_id=loan.book_id,
+                    member_id=loan.member_id,
+                    action_type='RETURNED',
+                    action_date=today
+                )
+                for loan in returning.values()
+            ])
+            for loan in returning.values():
+                loan.status = 'RETURNED'
+                loan.return_date = today
+            OutboxEvent.objects.bulk_create([OutboxEvent.for_loan(loan) for loan in returning.values()])
+            adjust_counters(returning.values(), -1)
+            invalidate_catalog()
+            publish_on_commit([event for loan in returning.values() for event in loan_events(loan)])
+
+    return results
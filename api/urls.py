@@ -1,6 +1,12 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import BookViewSet, LoanViewSet, LoanHistoryViewSet
+from .async_views import async_read_urls
+from .dashboard import DashboardView
+from .views import (
+    BookViewSet, LoanViewSet, LoanHistoryViewSet, JobViewSet, CatalogImportView, CirculationStatsView,
+    EventStreamView
+)
 from .health import api_health_check
 
 # Create router and register viewsets
@@ -8,11 +14,25 @@ router = DefaultRouter()
 router.register('books', BookViewSet)
 router.register('loans', LoanViewSet)
 router.register('history', LoanHistoryViewSet)
+router.register('jobs', JobViewSet)
+router_urls = async_read_urls(router.urls) if settings.ASYNC_READS else router.urls
 
 urlpatterns = [
     # Health check endpoint (no auth required)
     path('health/', api_health_check, name='api_health'),
+
+    # Staff-only catalog import
+    path('import/', CatalogImportView.as_view(), name='catalog_import'),
+
+    # Dashboard counters
+    path('stats/', CirculationStatsView.as_view(), name='circulation_stats'),
+
+    # First page of every collection for the staff home page
+    path('dashboard/', DashboardView.as_view(), name='dashboard'),
+
+    # Live availability and loan events (server-sent events, ASGI only)
+    path('events/', EventStreamView.as_view(), name='events'),
     
     # Router URLs
-    path('', include(router.urls)),
+    path('', include(router_urls)),
 ]
@@ -1,35 +1,88 @@
-from rest_framework import viewsets, status, filters
+import io
+from operator import attrgetter
+from asgiref.sync import sync_to_async
+from rest_framework import mixins, viewsets, status, filters, serializers
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
 from .permissions import IsStaffMember
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.urls import reverse
 from django.utils import timezone
-from .models import Book, Loan, LoanHistory
+from .models import ArchivedMember, Book, CategoryCounter, Job, Loan, LoanHistory, MemberCounter
 from .serializers import (
-    BookSerializer, LoanSerializer, LoanReturnSerializer, LoanHistorySerializer
+    BookSerializer, LoanSerializer, LoanReturnSerializer, LoanHistorySerializer,
+    BulkCheckoutSerializer, BulkReturnSerializer, JobSerializer
 )
+from . import jobs, services
+from .archive import archived_history
+from .events import EventStreamRenderer, event_stream, get_broker
+from .exports import EXPORT_CONTENT_TYPES, EXPORT_RENDERERS, HISTORY_COLUMNS, LOAN_COLUMNS, export_response
+from .importers import FORMATS, CatalogImporter, ImportAborted, guess_format, read_records
+from .overdue import overdue_filter
+from .search import FullTextSearchFilter
+from .cache import CachedResponseMixin, cache_stats
+from .conditional import ConditionalGetMixin
+from .async_views import AsyncReadMixin
+from .selection import FieldSelectionMixin
+from .pagination import EstimatedCountPagination, LoanPagination, LoanHistoryPagination
 
 
-class BookViewSet(viewsets.ModelViewSet):
+class BookViewSet(CachedResponseMixin, FieldSelectionMixin, ConditionalGetMixin, AsyncReadMixin, viewsets.ModelViewSet):
     """ViewSet for Book operations"""
     queryset = Book.objects.all()
     serializer_class = BookSerializer
     permission_classes = [IsAuthenticated, IsStaffMember]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    pagination_class = EstimatedCountPagination
+    # Search runs last so it can rank matches ahead of the default ordering
+    filter_backends = [filters.OrderingFilter, FullTextSearchFilter]
     search_fields = ['title', 'category']
     ordering_fields = ['title', 'category', 'created_at']
     ordering = ['title']
 
+    def get_queryset(self):
+        """Filter books based on query parameters"""
+        queryset = self.select_fields(super().get_queryset())
+
+        # Filter by availability
+        availability = self.request.query_params.get('availability', None)
+        if availability:
+            queryset = queryset.filter(availability=availability.lower() in ('true', '1'))
+
+        return queryset
+
 
-class LoanViewSet(viewsets.ModelViewSet):
+class LoanViewSet(FieldSelectionMixin, ConditionalGetMixin, AsyncReadMixin, viewsets.ModelViewSet):
     """ViewSet for Loan operations"""
     queryset = Loan.objects.all()
     serializer_class = LoanSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = LoanPagination
+    etag_fields = ('updated_at', 'book__updated_at', 'member__updated_at')
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['book__title', 'member__name', 'status']
-    ordering_fields = ['loan_date', 'return_date', 'status']
+    ordering_fields = ['loan_date', 'due_date', 'return_date', 'status']
     ordering = ['-loan_date']
+    async_read_actions = ('overdue',)
+
+    def perform_create(self, serializer):
+        """Surface a lost checkout race as a validation error"""
+        try:
+            serializer.save()
+        except ValueError as exc:
+            raise serializers.ValidationError({'book': str(exc)})
+
+    def perform_update(self, serializer):
+        """Surface a loan changed by a concurrent request as a validation error"""
+        try:
+            serializer.save()
+        except ValueError as exc:
+            raise serializers.ValidationError({'detail': str(exc)})
 
     @action(detail=True, methods=['patch'])
     def return_book(self, request, pk=None):
@@ -38,14 +91,70 @@ class LoanViewSet(viewsets.ModelViewSet):
         serializer = LoanReturnSerializer(loan, data=request.data)
         
         if serializer.is_valid():
-            serializer.save()
+            try:
+                serializer.save()
+            except ValueError as exc:
+                # Another request returned the loan after validation passed
+                return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
             return Response(serializer.data)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated, IsStaffMember],
+        renderer_classes=EXPORT_RENDERERS
+    )
+    def export(self, request, *args, **kwargs):
+        """Stream every loan matching the list filters as CSV (default) or JSON Lines"""
+        queryset = self.filter_queryset(self.get_queryset())
+        return export_response(queryset, LOAN_COLUMNS, 'loans', request.accepted_renderer.format)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        pagination_class=EstimatedCountPagination,
+        ordering=['due_date', 'id']
+    )
+    def overdue(self, request, *args, **kwargs):
+        """Loans still out past their due date, longest overdue first; takes the list filters"""
+        return self.list(request, *args, **kwargs)
+
+    async def aoverdue(self, request, *args, **kwargs):
+        return await self.alist(request, *args, **kwargs)
+
+    @action(detail=False, methods=['post'])
+    def bulk_checkout(self, request):
+        """Lend a cart of books in a single request"""
+        serializer = BulkCheckoutSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            results = services.bulk_checkout(serializer.validated_data['loans'])
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_409_CONFLICT)
+        return Response({'results': results})
+
+    @action(detail=False, methods=['post'])
+    def bulk_return(self, request):
+        """Return a cart of loans in a single request"""
+        serializer = BulkReturnSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            results = services.bulk_return(serializer.validated_data['loans'])
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_409_CONFLICT)
+        return Response({'results': results})
+
     def get_queryset(self):
         """Filter loans based on query parameters"""
-        queryset = super().get_queryset()
+        queryset = self.select_fields(super().get_queryset().select_related('book', 'member'))
+        if self.action == 'overdue':
+            queryset = queryset.filter(overdue_filter())
         
         # Filter by status
         status = self.request.query_params.get('status', None)
@@ -65,11 +174,13 @@ class LoanViewSet(viewsets.ModelViewSet):
         return queryset
 
 
-class LoanHistoryViewSet(viewsets.ReadOnlyModelViewSet):
+class LoanHistoryViewSet(FieldSelectionMixin, ConditionalGetMixin, AsyncReadMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for LoanHistory (read-only)"""
     queryset = LoanHistory.objects.all()
     serializer_class = LoanHistorySerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = LoanHistoryPagination
+    etag_fields = ('created_at', 'book__updated_at', 'member__updated_at')
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['book__title', 'member__name']
     ordering_fields = ['action_date', 'created_at']
@@ -77,7 +188,7 @@ class LoanHistoryViewSet(viewsets.ReadOnlyModelViewSet):
 
     def get_queryset(self):
         """Filter history based on query parameters"""
-        queryset = super().get_queryset()
+        queryset = self.select_fields(super().get_queryset().select_related('book', 'member'))
         
         # Filter by date range
         start_date = self.request.query_params.get('start_date', None)
@@ -99,3 +210,224 @@ class LoanHistoryViewSet(viewsets.ReadOnlyModelViewSet):
             queryset = queryset.filter(book_id=book_id)
         
         return queryset
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated, IsStaffMember],
+        renderer_classes=EXPORT_RENDERERS
+    )
+    def export(self, request, *args, **kwargs):
+        """Stream the history matching the list filters as CSV (default) or JSON Lines; archived rows are not included"""
+        queryset = self.filter_queryset(self.get_queryset())
+        return export_response(queryset, HISTORY_COLUMNS, 'history', request.accepted_renderer.format)
+
+    def list(self, request, *args, **kwargs):
+        if not self.has_archived_rows():
+            return super().list(request, *args, **kwargs)
+        return self.list_with_archive(request)
+
+    async def alist(self, request, *args, **kwargs):
+        if not await sync_to_async(self.has_archived_rows)():
+            return await super().alist(request, *args, **kwargs)
+        return await sync_to_async(self.list_with_archive)(request)
+
+    def has_archived_rows(self):
+        """Whether the ?member= being listed has history in the archive (see api/archive.py)"""
+        member_id = self.request.query_params.get('member')
+        if not member_id:
+            return False
+        try:
+            return ArchivedMember.objects.filter(member_id=member_id, segment__kind='history').exists()
+        except ValidationError:
+            return False
+
+    def list_with_archive(self, request):
+        """
+        List a member's live and archived history together.
+
+        A member's history is small, so both are merged, searched, ordered
+        and paginated in memory.
+        """
+        params = request.query_params
+        live = list(self.filter_queryset(self.get_queryset()))
+        terms = [term.lower() for term in filters.SearchFilter().get_search_terms(request)]
+        archived = [
+            row for row in archived_history(
+                params['member'], params.get('start_date'), params.get('end_date'), params.get('book')
+            )
+            if all(term in row.book_title.lower() or term in row.member_name.lower() for term in terms)
+        ]
+
+        rows = live + archived
+        ordering = filters.OrderingFilter().get_ordering(request, self.get_queryset(), self)
+        for field in reversed(ordering):
+            rows.sort(key=attrgetter(field.lstrip('-')), reverse=field.startswith('-'))
+
+        page = self.paginate_queryset(rows)
+        return self.list_response(request, rows if page is None else page, page is not None)
+
+
+class CatalogImportView(APIView):
+    """
+    Staff-only CSV/JSONL upload of books or members. Uploads larger than
+    IMPORT_INLINE_MAX_BYTES are imported by a background job: the response
+    is 202 with the job, to follow at its Location.
+    """
+    permission_classes = [IsAuthenticated, IsStaffMember]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        """Import the uploaded `file` as `kind` (books or members)"""
+        kind = request.data.get('kind')
+        upload = request.data.get('file')
+        if kind not in ('books', 'members'):
+            return Response({'kind': 'Must be "books" or "members".'}, status=status.HTTP_400_BAD_REQUEST)
+        if upload is None:
+            return Response({'file': 'This field is required.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        fmt = request.data.get('format') or guess_format(upload.name)
+        if fmt not in FORMATS:
+            return Response({'format': f'Must be one of {", ".join(FORMATS)}.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if upload.size > settings.IMPORT_INLINE_MAX_BYTES:
+            params = {'kind': kind, 'file': jobs.save_upload(upload, fmt), 'format': fmt}
+            job = jobs.enqueue('import_catalog', params, user=request.user)
+            return job_accepted(request, job)
+
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8', newline='')
+        try:
+            summary = CatalogImporter(kind).run(read_records(stream, fmt))
+        except ImportAborted as exc:
+            # Chunks before the bad line are committed; say how far the import got
+            return Response(
+                {'detail': str(exc), 'line': exc.line, **exc.summary},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(summary)
+
+
+def job_accepted(request, job):
+    """202 Accepted for a queued job, pointing at its status endpoint"""
+    location = request.build_absolute_uri(reverse('job-detail', kwargs={'pk': job.pk}))
+    return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED, headers={'Location': location})
+
+
+class JobViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    Background jobs (see api/jobs.py): queue one with POST, then poll its
+    status, progress and result.
+    """
+    queryset = Job.objects.select_related('created_by')
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated, IsStaffMember]
+
+    def get_queryset(self):
+        """Filter jobs based on query parameters"""
+        queryset = super().get_queryset()
+
+        job_status = self.request.query_params.get('status', None)
+        if job_status:
+            queryset = queryset.filter(status=job_status.upper())
+
+        kind = self.request.query_params.get('kind', None)
+        if kind:
+            queryset = queryset.filter(kind=kind)
+
+        return queryset
+
+    def create(self, request, *args, **kwargs):
+        """Queue a job of `kind` with `params`"""
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        kind = serializer.validated_data['kind']
+        try:
+            params = jobs.clean_params(kind, serializer.validated_data.get('params', {}))
+        except serializers.ValidationError as exc:
+            return Response(exc.detail, status=status.HTTP_400_BAD_REQUEST)
+        job = jobs.enqueue(kind, params, priority=serializer.validated_data.get('priority', 0), user=request.user)
+        return job_accepted(request, job)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """The file a finished export job wrote"""
+        job = self.get_object()
+        if job.kind != 'export' or job.status != 'SUCCEEDED':
+            raise Http404('This job has no file to download.')
+        path = jobs.job_path(job.result['file'])
+        if not path.exists():
+            raise Http404('The export file is gone.')
+        return FileResponse(
+            open(path, 'rb'),
+            as_attachment=True,
+            filename=job.result['file'],
+            content_type=f"{EXPORT_CONTENT_TYPES[job.result['format']]}; charset=utf-8"
+        )
+
+
+class CirculationStatsView(APIView):
+    """Availability per category and active loans per member, read from the maintained counters"""
+    permission_classes = [IsAuthenticated]
+
+    # Members listed under `top_members`
+    TOP_MEMBERS = 10
+
+    def get(self, request):
+        categories = list(CategoryCounter.objects.values('category', 'available', 'loaned'))
+        top_members = MemberCounter.objects.filter(active_loans__gt=0).order_by('-active_loans')
+        data = {
+            'totals': {
+                'available': sum(row['available'] for row in categories),
+                'loaned': sum(row['loaned'] for row in categories),
+            },
+            'categories': categories,
+            'catalog_cache': cache_stats(),
+            'top_members': [
+                {'member': str(member_id), 'active_loans': active_loans}
+                for member_id, active_loans in top_members.values_list(
+                    'member_id', 'active_loans'
+                )[:self.TOP_MEMBERS]
+            ],
+        }
+
+        member_id = request.query_params.get('member', None)
+        if member_id:
+            try:
+                counter = MemberCounter.objects.filter(member_id=member_id).first()
+            except ValidationError:
+                return Response({'member': 'Must be a valid UUID.'}, status=status.HTTP_400_BAD_REQUEST)
+            data['member'] = {
+                'member': member_id,
+                'active_loans': counter.active_loans if counter else 0,
+            }
+
+        return Response(data)
+
+
+class EventStreamView(APIView):
+    """
+    Server-sent events for book availability and loan status changes (see
+    api/events.py). Streams stay open indefinitely, so they are only served
+    by the ASGI server, where an idle stream holds no worker thread.
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+
+    def get(self, request):
+        if not settings.ASYNC_READS:
+            return Response(
+                {'detail': 'Live events need the ASGI server (SERVER_MODE=asgi).'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        response = StreamingHttpResponse(
+            event_stream(get_broker(), settings.EVENTS_KEEPALIVE),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        # Keep nginx from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 import os
 from pathlib import Path
 from datetime import timedelta
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 import dj_database_url
 
@@ -98,9 +99,10 @@ TAILWIND_APP_NAME = 'theme'
 AUTH_USER_MODEL = 'accounts.User'
 
 # Authentication backends
+# LoginBackend subclasses ModelBackend, so permissions still work; listing
+# ModelBackend as well would hash every wrong password a second time.
 AUTHENTICATION_BACKENDS = [
     'accounts.backends.LoginBackend',
-    'django.contrib.auth.backends.ModelBackend',
 ]
 
 MIDDLEWARE = [
@@ -133,19 +135,120 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
+
+# 'wsgi' (sync gunicorn workers) or 'asgi' (uvicorn workers), see entrypoint.sh.
+# Under ASGI the book, loan, history and member list/detail GETs are served by
+# async views (api/async_views.py).
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
+ASYNC_READS = SERVER_MODE == 'asgi'
 
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# DB_CONN_MAX_AGE keeps connections open between requests. It is forced to 0
+# under ASGI, where each request's sync work runs on its own thread and would
+# strand a persistent connection when the thread exits, and with DB_POOL.
+# DB_CONN_HEALTH_CHECKS pings a reused connection once per request.
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', '600'))
+DB_CONN_HEALTH_CHECKS = bool(int(os.environ.get('DB_CONN_HEALTH_CHECKS', '1')))
+
+# DB_POOL hands connections out from a psycopg 3 pool (PostgreSQL only) and
+# takes them back at the end of each request, so threads and ASGI requests
+# share a few backends instead of opening their own. Each gunicorn worker
+# has its own pool: expect up to WEB_CONCURRENCY * DB_POOL_MAX_SIZE backends.
+# DB_POOL_TIMEOUT is how long a request waits for a free connection;
+# DB_POOL_MAX_IDLE and DB_POOL_MAX_LIFETIME retire idle and old connections.
+DB_POOL = bool(int(os.environ.get('DB_POOL', '0')))
+DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', '2'))
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '10'))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '30'))
+DB_POOL_MAX_IDLE = float(os.environ.get('DB_POOL_MAX_IDLE', '600'))
+DB_POOL_MAX_LIFETIME = float(os.environ.get('DB_POOL_MAX_LIFETIME', '3600'))
+
 DATABASES = {
     'default': dj_database_url.config(
         default=os.environ.get('DATABASE_URL', 'sqlite:///db.sqlite3'),
-        conn_max_age=600,
-        conn_health_checks=True,
+        conn_max_age=0 if ASYNC_READS else DB_CONN_MAX_AGE,
+        conn_health_checks=DB_CONN_HEALTH_CHECKS,
     )
 }
-
+if DB_POOL and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': DB_POOL_MIN_SIZE,
+        'max_size': DB_POOL_MAX_SIZE,
+        'timeout': DB_POOL_TIMEOUT,
+        'max_idle': DB_POOL_MAX_IDLE,
+        'max_lifetime': DB_POOL_MAX_LIFETIME,
+    }
+
+
+# Cache
+# Catalog responses are cached here. Use a shared cache (REDIS_URL) whenever
+# more than one worker runs, otherwise each worker only sees its own
+# invalidations and may serve stale data until CATALOG_CACHE_TIMEOUT.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Seconds a cached book list/detail response is kept
+CATALOG_CACHE_TIMEOUT = int(os.environ.get('CATALOG_CACHE_TIMEOUT', '60'))
+
+# Seconds an authenticated user is kept in the cache between token checks
+AUTH_USER_CACHE_TIMEOUT = int(os.environ.get('AUTH_USER_CACHE_TIMEOUT', '60'))
+
+
+# Live events (/api/events/, see api/events.py)
+# EVENTS_BROKER is the broker class. api.events.LocalBroker only reaches the
+# streams of the process that made the change, so it suits a single worker;
+# api.events.PostgresBroker (LISTEN/NOTIFY) reaches every worker and node.
+# Unset, it is PostgresBroker on PostgreSQL when gunicorn runs more than one
+# worker (WEB_CONCURRENCY, same default as gunicorn.conf.py), else
+# LocalBroker. EVENTS_KEEPALIVE is the number of seconds between keepalive
+# comments on an idle stream.
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', '2'))
+EVENTS_BROKER = os.environ.get('EVENTS_BROKER') or (
+    'api.events.PostgresBroker'
+    if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql' and WEB_CONCURRENCY > 1
+    else 'api.events.LocalBroker'
+)
+EVENTS_KEEPALIVE = float(os.environ.get('EVENTS_KEEPALIVE', '15'))
+
+
+# Password hashing
+# PASSWORD_HASHER picks the algorithm for new hashes: pbkdf2 (default),
+# argon2 (needs argon2-cffi) or bcrypt (needs bcrypt). Hashes made with
+# another algorithm or an older work factor are upgraded on the next
+# successful login. Use `manage.py benchmark_logins` to size the cost.
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'pbkdf2')
+_PASSWORD_HASHERS = {
+    'pbkdf2': 'accounts.hashers.PBKDF2PasswordHasher',
+    'argon2': 'accounts.hashers.Argon2PasswordHasher',
+    'bcrypt': 'accounts.hashers.BCryptSHA256PasswordHasher',
+}
+if PASSWORD_HASHER not in _PASSWORD_HASHERS:
+    raise ImproperlyConfigured(
+        f'PASSWORD_HASHER must be one of {", ".join(_PASSWORD_HASHERS)}, not {PASSWORD_HASHER!r}.'
+    )
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[PASSWORD_HASHER]] + [
+    path for name, path in _PASSWORD_HASHERS.items() if name != PASSWORD_HASHER
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+PBKDF2_ITERATIONS = int(os.environ.get('PBKDF2_ITERATIONS', '0')) or None
+ARGON2_TIME_COST = int(os.environ.get('ARGON2_TIME_COST', '2'))
+ARGON2_MEMORY_COST = int(os.environ.get('ARGON2_MEMORY_COST', '102400'))
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
 
 
 # Password validation
@@ -196,7 +299,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -205,6 +308,68 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 10
 }
 
+# Rows counted exactly by EstimatedCountPagination before switching to an estimate
+PAGINATION_COUNT_CAP = int(os.environ.get('PAGINATION_COUNT_CAP', '1000'))
+
+# Largest ?page_size= accepted by cursor (keyset) pagination on loans and history
+CURSOR_PAGINATION_MAX_PAGE_SIZE = int(os.environ.get('CURSOR_PAGINATION_MAX_PAGE_SIZE', '100'))
+
+# Archival (api/archive.py): returned loans and history rows older than
+# ARCHIVE_HORIZON_DAYS move to gzipped JSONL files under ARCHIVE_DIR, at most
+# ARCHIVE_BATCH_SIZE rows per file and per transaction. Archived rows only
+# exist in those files, so ARCHIVE_DIR must be persistent storage shared by
+# the web and job worker processes (a mounted volume, not the app directory,
+# which Railway and Docker rebuild on every deploy); archiving refuses to run
+# until it is set.
+ARCHIVE_DIR = Path(os.environ['ARCHIVE_DIR']) if os.environ.get('ARCHIVE_DIR') else None
+ARCHIVE_HORIZON_DAYS = int(os.environ.get('ARCHIVE_HORIZON_DAYS', '730'))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '5000'))
+
+# Outbox (api/outbox.py): `manage.py run_outbox_worker` claims up to
+# OUTBOX_BATCH_SIZE events at a time and polls every OUTBOX_POLL_INTERVAL
+# seconds when none is due. Other workers skip a claimed batch for
+# OUTBOX_CLAIM_TIMEOUT seconds, after which a batch whose worker died is
+# handed out again. An event whose handlers failed OUTBOX_MAX_ATTEMPTS times
+# is kept, with its last error, but no longer retried.
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', '100'))
+OUTBOX_POLL_INTERVAL = float(os.environ.get('OUTBOX_POLL_INTERVAL', '1'))
+OUTBOX_CLAIM_TIMEOUT = int(os.environ.get('OUTBOX_CLAIM_TIMEOUT', '300'))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '10'))
+
+# Member loan notices (api/outbox_handlers.py): with MEMBER_LOAN_NOTICES on,
+# the outbox worker emails members about their checkouts, returns and overdue
+# loans. They are off by default. The console backend prints messages
+# instead of sending them; set EMAIL_BACKEND to
+# django.core.mail.backends.smtp.EmailBackend and the EMAIL_HOST settings to
+# deliver them.
+MEMBER_LOAN_NOTICES = bool(int(os.environ.get('MEMBER_LOAN_NOTICES', '0')))
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', '25'))
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = bool(int(os.environ.get('EMAIL_USE_TLS', '0')))
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'library@localhost')
+
+# Background jobs (api/jobs.py): `manage.py run_job_worker` polls every
+# JOB_POLL_INTERVAL seconds when no job is due, and hands out again a running
+# job that has not reported progress for JOB_TIMEOUT seconds. Uploads and
+# export files live under JOBS_DIR, which must be a volume web and worker
+# processes share.
+# Catalog uploads larger than IMPORT_INLINE_MAX_BYTES are imported as a job.
+JOBS_DIR = Path(os.environ.get('JOBS_DIR', BASE_DIR / 'jobs'))
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', '1'))
+JOB_TIMEOUT = int(os.environ.get('JOB_TIMEOUT', '900'))
+IMPORT_INLINE_MAX_BYTES = int(os.environ.get('IMPORT_INLINE_MAX_BYTES', str(1024 * 1024)))
+
+# Due dates and overdue loans: LOAN_DUE_DATE_POLICY (api/policies.py) sets
+# each new loan's due date, by default LOAN_PERIOD_DAYS after checkout.
+# `manage.py sweep_overdue` marks overdue loans OVERDUE_SWEEP_BATCH_SIZE at a
+# time, one transaction per batch.
+LOAN_DUE_DATE_POLICY = os.environ.get('LOAN_DUE_DATE_POLICY', 'api.policies.FixedPeriodPolicy')
+LOAN_PERIOD_DAYS = int(os.environ.get('LOAN_PERIOD_DAYS', '14'))
+OVERDUE_SWEEP_BATCH_SIZE = int(os.environ.get('OVERDUE_SWEEP_BATCH_SIZE', '1000'))
+
 # JWT settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),
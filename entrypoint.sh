@@ -63,10 +63,17 @@ fi
 echo "Applying database migrations..."
 python manage.py migrate --noinput
 
+# Make sure the coming months have loan history partitions (PostgreSQL)
+python manage.py partition_history
+
 # Collect static files
 echo "Collecting static files..."
 python manage.py collectstatic --noinput
 
 # Start server
-echo "Starting server..."
-exec gunicorn config.wsgi:application --bind 0.0.0.0:${PORT:-8000} --workers 2
+# Workers, threads and worker class come from the environment (SERVER_MODE,
+# WEB_CONCURRENCY, GUNICORN_THREADS, ...), see gunicorn.conf.py. SERVER_MODE=asgi
+# runs the ASGI app on uvicorn workers, which serve the book/loan/history/member
+# reads with async views; the default is sync WSGI.
+echo "Starting server (${SERVER_MODE:-wsgi})..."
+exec gunicorn --config gunicorn.conf.py
@@ -0,0 +1,43 @@
+"""
+Gunicorn settings, read from the environment so workers can be tuned without code changes.
+
+    SERVER_MODE            wsgi (default) or asgi; picks the app and the default worker class
+    WEB_CONCURRENCY        worker processes (default 2)
+    GUNICORN_THREADS       threads per worker (default 1); above 1 WSGI uses gthread workers
+    GUNICORN_WORKER_CLASS  explicit worker class, overriding the default above
+    GUNICORN_TIMEOUT       seconds before a silent worker is restarted (default 120)
+    GUNICORN_MAX_REQUESTS  requests before a worker is recycled (default 1000, 0 disables)
+
+Measure candidate settings with `python manage.py loadtest --serve`.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+threads = int(os.environ.get('GUNICORN_THREADS', '1'))
+
+if os.environ.get('SERVER_MODE', 'wsgi') == 'asgi':
+    wsgi_app = 'config.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    wsgi_app = 'config.wsgi:application'
+    worker_class = 'gthread' if threads > 1 else 'sync'
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', worker_class)
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = max_requests // 10
+loglevel = 'info'
+
+
+def on_starting(server):
+    """Warn when live events published by one worker cannot reach the streams of the others"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    from django.conf import settings
+
+    if server.cfg.workers > 1 and settings.EVENTS_BROKER == 'api.events.LocalBroker':
+        server.log.warning(
+            'EVENTS_BROKER is api.events.LocalBroker with %s workers: /api/events/ streams only '
+            'see changes made in their own worker. Use api.events.PostgresBroker or WEB_CONCURRENCY=1.',
+            server.cfg.workers
+        )
@@ -11,6 +11,20 @@ echo "DATABASE_URL: ${DATABASE_URL:0:50}..." # Show first 50 chars only for secu
 echo "RAILWAY_ENVIRONMENT_NAME: ${RAILWAY_ENVIRONMENT_NAME:-'not set'}"
 echo "RAILWAY_PUBLIC_DOMAIN: ${RAILWAY_PUBLIC_DOMAIN:-'not set'}"
 
+# Worker processes (see Procfile) run from the same image as web: give the
+# process type as the first argument. They leave migrations and static files
+# to the web process, and the platform restarts them until the schema is ready.
+case "${1:-web}" in
+    outbox)
+        echo "Starting outbox worker..."
+        exec python manage.py run_outbox_worker
+        ;;
+    worker)
+        echo "Starting job worker..."
+        exec python manage.py run_job_worker
+        ;;
+esac
+
 # Apply database migrations with retry logic
 echo "Applying database migrations..."
 max_retries=5
@@ -33,16 +47,17 @@ if [ $retry_count -eq $max_retries ]; then
     echo "Migrations failed after $max_retries attempts. Starting server anyway..."
 fi
 
+# Make sure the coming months have loan history partitions (PostgreSQL)
+python manage.py partition_history || echo "Creating history partitions failed, continuing..."
+
 # Collect static files
 echo "Collecting static files..."
 python manage.py collectstatic --noinput || echo "Static file collection failed, continuing..."
 
 # Start server
-echo "Starting server on port ${PORT:-8000}..."
-exec gunicorn config.wsgi:application \
-    --bind 0.0.0.0:${PORT:-8000} \
-    --workers 2 \
-    --timeout 120 \
-    --max-requests 1000 \
-    --max-requests-jitter 100 \
-    --log-level info
+# Workers, threads and worker class come from the environment (SERVER_MODE,
+# WEB_CONCURRENCY, GUNICORN_THREADS, ...), see gunicorn.conf.py. SERVER_MODE=asgi
+# runs the ASGI app on uvicorn workers, which serve the book/loan/history/member
+# reads with async views; the default is sync WSGI.
+echo "Starting server on port ${PORT:-8000} (${SERVER_MODE:-wsgi})..."
+exec gunicorn --config gunicorn.conf.py